@@ -0,0 +1,63 @@
+"""Compares raw PyMuPDF text with the structured extraction stage.
+
+Reports characters, estimated prompt tokens, embedding chunk counts and
+extraction time per PDF. Run from the backend directory:
+
+    python -m benchmarks.bench_extraction [pdf ...]
+"""
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Keep the service singletons away from the real data directories
+_scratch = tempfile.mkdtemp(prefix="rp_bench_")
+os.environ.setdefault("CHROMA_DB_PATH", os.path.join(_scratch, "chroma"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_scratch, "uploads"))
+os.environ.setdefault("COORDINATION_DIR", os.path.join(_scratch, "coordination"))
+os.environ["GEMINI_API_KEY"] = ""
+
+from services.context_service import context_service
+from services.document_service import document_service
+from services.rag_service import rag_service
+
+SAMPLE_PDFS = os.path.join(os.path.dirname(__file__), "fixtures", "*.pdf")
+
+def bench_pdf(path: str) -> dict:
+    start = time.perf_counter()
+    raw = document_service.extract_text_from_pdf(path)
+    raw_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    structure = document_service.extract_structured(path)
+    structured_seconds = time.perf_counter() - start
+
+    body = structure["text"]
+    return {
+        "file": os.path.basename(path),
+        "raw_chars": len(raw),
+        "body_chars": len(body),
+        "raw_tokens": context_service.count_tokens(raw),
+        "body_tokens": context_service.count_tokens(body),
+        "raw_chunks": len(rag_service._chunk_text(raw)),
+        "body_chunks": len(rag_service._chunk_sections(body, structure["sections"])),
+        "sections": len(structure["sections"]),
+        "raw_ms": round(raw_seconds * 1000, 1),
+        "structured_ms": round(structured_seconds * 1000, 1),
+    }
+
+def main(paths: list[str]):
+    results = [bench_pdf(p) for p in paths]
+    raw_tokens = sum(r["raw_tokens"] for r in results) or 1
+    raw_chunks = sum(r["raw_chunks"] for r in results) or 1
+    report = {
+        "pdfs": results,
+        "token_reduction": round(1 - sum(r["body_tokens"] for r in results) / raw_tokens, 3),
+        "chunk_reduction": round(1 - sum(r["body_chunks"] for r in results) / raw_chunks, 3),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob(SAMPLE_PDFS)))
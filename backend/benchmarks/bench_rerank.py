@@ -0,0 +1,93 @@
+"""Measures the reranking stage on the sample papers: scorer latency and context tokens saved.
+
+Chunks come from the structured extraction of each PDF; candidates are ranked
+by the offline fake embedding, as Chroma would return them. Run from the
+backend directory:
+
+    python -m benchmarks.bench_rerank [--top-k 10] [--scorer bm25]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_scratch = tempfile.mkdtemp(prefix="rp_bench_")
+os.environ.setdefault("CHROMA_DB_PATH", os.path.join(_scratch, "chroma"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_scratch, "uploads"))
+os.environ.setdefault("COORDINATION_DIR", os.path.join(_scratch, "coordination"))
+os.environ["GEMINI_API_KEY"] = ""
+
+with contextlib.redirect_stdout(sys.stderr):
+    from benchmarks.fakes import fake_embedding
+    from core.config import settings
+    from services.context_service import context_service
+    from services.document_service import document_service
+    from services.rag_service import rag_service
+    from services.rerank_service import rerank_service
+
+SAMPLE_PDFS = os.path.join(os.path.dirname(__file__), "fixtures", "*.pdf")
+QUERIES = [
+    "What problem does the paper address?",
+    "Which methodology do the authors use?",
+    "What are the main results?",
+    "What datasets or case studies are used?",
+    "What limitations are discussed?",
+    "How does cloud computing support e-learning?",
+]
+
+def _distance(a: list[float], b: list[float]) -> float:
+    return 1 - sum(x * y for x, y in zip(a, b))
+
+def run(paths: list[str], top_k: int) -> dict:
+    rows = []
+    for path in paths:
+        structure = document_service.extract_structured(path)
+        chunks = [chunk for chunk, _ in rag_service._chunk_sections(structure["text"], structure["sections"])]
+        vectors = [fake_embedding(chunk) for chunk in chunks]
+        for query in QUERIES:
+            query_vector = fake_embedding(query)
+            ranked = sorted(range(len(chunks)), key=lambda i: _distance(query_vector, vectors[i]))
+            candidates = ranked[:rerank_service.candidates_for(top_k)]
+            start = time.perf_counter()
+            kept = rerank_service.rerank(
+                query, [chunks[i] for i in candidates], [_distance(query_vector, vectors[i]) for i in candidates],
+                top_k, context_service.budget_for("query"), "bench"
+            )
+            elapsed = time.perf_counter() - start
+            top_k_tokens = sum(context_service.count_tokens(chunks[i]) for i in ranked[:top_k])
+            rows.append({
+                "rerank_ms": elapsed * 1000,
+                "top_k_tokens": top_k_tokens,
+                "kept_tokens": sum(context_service.count_tokens(c) for c in kept),
+            })
+    return {
+        "scorer": settings.RERANK_SCORER,
+        "top_k": top_k,
+        "candidates": settings.RERANK_CANDIDATES,
+        "keep": settings.RERANK_KEEP,
+        "queries": len(rows),
+        "rerank_p50_ms": round(statistics.median(r["rerank_ms"] for r in rows), 3),
+        "context_tokens_top_k": sum(r["top_k_tokens"] for r in rows),
+        "context_tokens_reranked": sum(r["kept_tokens"] for r in rows),
+        "token_reduction": round(1 - sum(r["kept_tokens"] for r in rows) / (sum(r["top_k_tokens"] for r in rows) or 1), 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reranking stage benchmark")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--scorer", help="override RERANK_SCORER")
+    parser.add_argument("pdfs", nargs="*")
+    args = parser.parse_args(argv)
+    if args.scorer:
+        settings.RERANK_SCORER = args.scorer
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args.pdfs or sorted(glob.glob(SAMPLE_PDFS))[:1], args.top_k)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
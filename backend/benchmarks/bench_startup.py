@@ -0,0 +1,64 @@
+"""Measures API cold start: module import time and time-to-first-request.
+
+Each run is a fresh interpreter so nothing is cached between measurements.
+
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_PROBE = r"""
+import json, sys, time, contextlib
+start = time.perf_counter()
+with contextlib.redirect_stdout(sys.stderr):
+    import main
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        client.get("/api/health/live")
+        first_request = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_request - start) * 1000,
+}))
+"""
+
+def measure_once(env: dict) -> dict:
+    backend_dir = os.path.join(os.path.dirname(__file__), "..")
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _PROBE],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="rp_startup_")
+    env = {
+        **os.environ,
+        "CHROMA_DB_PATH": os.path.join(scratch, "chroma"),
+        "UPLOAD_DIR": os.path.join(scratch, "uploads"),
+        "COORDINATION_DIR": os.path.join(scratch, "coordination"),
+    }
+    try:
+        runs = [measure_once(env) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    report = {
+        metric: round(statistics.median(run[metric] for run in runs), 1)
+        for metric in ("import_ms", "first_request_ms")
+    }
+    report["runs"] = args.runs
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Local stand-ins for Gemini and Wikipedia used by the offline benchmarks."""
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from types import SimpleNamespace
+
+EMBEDDING_DIM = 64
+
+def fake_embedding(text: str) -> list[float]:
+    """Deterministic unit vector derived from the words of a text."""
+    vector = [0.0] * EMBEDDING_DIM
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode()).digest()
+        vector[digest[0] % EMBEDDING_DIM] += 1.0 if digest[1] % 2 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class FakeModels:
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.embed_calls = 0
+        self.generate_calls = 0
+
+    def embed_content(self, model: str, contents, config=None):
+        self.embed_calls += 1
+        texts = contents if isinstance(contents, list) else [contents]
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_embedding(t)) for t in texts])
+
+    def generate_content(self, model: str, contents, config=None):
+        self.generate_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        if "mind map" in prompt:
+            text = '{"name": "Paper", "children": [{"name": "Problem", "children": []}, {"name": "Methodology", "children": []}, {"name": "Results", "children": []}]}'
+        elif "Questions:" in prompt:
+            numbers = re.findall(r"^(\d+)\. ", prompt.split("Questions:")[1], re.MULTILINE)
+            text = json.dumps({"answers": [{"number": int(n), "answer": f"Offline answer {n}."} for n in numbers]})
+        elif "Score:" in prompt:
+            text = "Score: 87\nFeatures: Cloud platforms, E-learning, Data mining"
+        else:
+            text = "Offline answer. " * 20
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        response = self.generate_content(model, contents, config)
+        for i in range(0, len(response.text), 40):
+            yield SimpleNamespace(text=response.text[i:i + 40])
+
+class FakeGenAIClient:
+    """Mimics the google-genai client surface used by RAGService."""
+    def __init__(self, latency_ms: float = 0):
+        self.models = FakeModels(latency_ms)
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> dict:
+        return self._payload
+
+def fake_wikipedia_get(url: str, params: dict = None, headers: dict = None, **kwargs) -> FakeResponse:
+    """Answers Wikipedia search and extract queries with canned results."""
+    params = params or {}
+    if params.get("list") == "search":
+        term = params.get("srsearch", "")
+        results = [
+            {"title": f"{term} topic {i}", "snippet": f"About {term} ({i})", "pageid": 1000 + i}
+            for i in range(10)
+        ]
+        return FakeResponse({"query": {"search": results}})
+    pageid = str(params.get("pageids", "0"))
+    extract = "Cloud computing delivers computing services over the internet. " * 200
+    return FakeResponse({"query": {"pages": {pageid: {"extract": extract}}}})
+
+class CountingGenAIClient(FakeGenAIClient):
+    """Fake client that appends one line per generation to a file shared by all processes."""
+    def __init__(self, log_path: str, latency_ms: float = 0):
+        super().__init__(latency_ms)
+        models = self.models
+        original = models.generate_content
+
+        def generate_content(model: str, contents, config=None):
+            with open(log_path, "a") as f:
+                f.write(f"{os.getpid()}\n")
+            return original(model, contents, config)
+
+        models.generate_content = generate_content
+
+class FakeChromaCollection:
+    """Returns the same handful of chunks for every query."""
+    def __init__(self, chunks: list[str]):
+        self.chunks = chunks
+
+    def query(self, query_embeddings, n_results: int = 5, where=None, **kwargs):
+        docs = self.chunks[:n_results]
+        return {"documents": [docs for _ in query_embeddings], "metadatas": [[{} for _ in docs] for _ in query_embeddings]}
+
+    def count(self) -> int:
+        return len(self.chunks)
+
+class FileCollection:
+    """Just enough of a Mongo collection, stored in one JSON file, for cross-process tests."""
+    def __init__(self, path: str):
+        from services.coordination_service import FileLockBackend
+        self.path = path
+        self._locks = FileLockBackend(os.path.dirname(path))
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def find_one(self, filter: dict, projection: dict = None):
+        with self._locks.hold(self.path, timeout=30):
+            doc = self._load().get(filter["_id"])
+        if doc and projection:
+            doc = {k: v for k, v in doc.items() if projection.get(k, 1)}
+        return doc
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        with self._locks.hold(self.path, timeout=30):
+            docs = self._load()
+            if filter["_id"] in docs or upsert:
+                doc = docs.setdefault(filter["_id"], {"_id": filter["_id"]})
+                for key, value in update.get("$set", {}).items():
+                    # Dotted keys address nested fields, as in Mongo
+                    *parents, leaf = key.split(".")
+                    target = doc
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[leaf] = value
+            with open(self.path, "w") as f:
+                json.dump(docs, f)
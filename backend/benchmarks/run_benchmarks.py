@@ -0,0 +1,189 @@
+"""Offline benchmark suite for the backend hot paths.
+
+Gemini, MongoDB and Wikipedia are replaced with local fakes (benchmarks/fakes.py
+and mongomock); Chroma runs for real in a scratch directory. Results are
+written as JSON. With --baseline, each case's p50 is compared against a
+previous run and the process exits non-zero on a regression.
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --threshold 1.25
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+# Point every service at scratch storage before the singletons are built
+_scratch = tempfile.mkdtemp(prefix="rp_bench_")
+os.environ["CHROMA_DB_PATH"] = os.path.join(_scratch, "chroma")
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch, "uploads")
+os.environ["COORDINATION_DIR"] = os.path.join(_scratch, "coordination")
+os.environ["GEMINI_API_KEY"] = ""
+# The suite measures latency, not admission control
+os.environ["TENANT_QUOTAS"] = "{}"
+# Post-ingestion precompute would run in the background during later cases and skew llm_calls
+os.environ["PRECOMPUTE_ARTIFACTS"] = "[]"
+
+import mongomock
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import FakeGenAIClient, fake_wikipedia_get
+
+# Service start-up logging goes to stderr so stdout stays valid JSON
+with contextlib.redirect_stdout(sys.stderr):
+    import main
+    from services.db_service import db_service
+    from services.rag_service import rag_service
+    from services.search_service import search_service
+
+SAMPLE_PDF_PATTERN = os.path.join(os.path.dirname(__file__), "fixtures", "*.pdf")
+SAMPLE_PDFS = sorted(glob.glob(SAMPLE_PDF_PATTERN))
+
+def _summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+def _timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples)
+
+class BenchmarkSuite:
+    def __init__(self, llm_latency_ms: float):
+        self.fake_client = FakeGenAIClient(latency_ms=llm_latency_ms)
+        rag_service.client = self.fake_client
+        db_service.docs_collection = mongomock.MongoClient().researchpilot_db.documents
+        self.http = TestClient(main.app)
+        if not SAMPLE_PDFS:
+            # Without a paper, ingestion, query, query_batch and compare_bulk cannot run at all
+            raise FileNotFoundError(f"No sample PDFs found under {os.path.dirname(SAMPLE_PDF_PATTERN)}")
+        self.pdf_bytes = open(SAMPLE_PDFS[0], "rb").read()
+        self.document_ids: list[str] = []
+
+    def _upload(self) -> str:
+        response = self.http.post("/api/upload", files={"file": ("paper.pdf", self.pdf_bytes, "application/pdf")})
+        document_id = response.json()["document_id"]
+        # TestClient runs background tasks before returning, so the document is ready here
+        assert db_service.get_document(document_id)["status"] == "ready"
+        return document_id
+
+    def bench_ingestion(self, repeat: int) -> dict:
+        def ingest():
+            # Clear the content hashes so deduplication does not short-circuit the pipeline
+            db_service.docs_collection.update_many({}, {"$unset": {"content_hash": ""}})
+            self.document_ids.append(self._upload())
+        return _timed(ingest, repeat)
+
+    def bench_query(self, repeat: int) -> dict:
+        document_id = self.document_ids[0]
+        return _timed(lambda: self.http.post("/api/query", json={"document_id": document_id, "query": "How does cloud computing support e-learning?"}), repeat)
+
+    def bench_query_batch(self, repeat: int) -> dict:
+        document_id = self.document_ids[0]
+        queries = [f"What does the paper say about topic {i}?" for i in range(10)]
+        def run_batch():
+            response = self.http.post("/api/query_batch", json={"document_id": document_id, "queries": queries})
+            assert len(response.text.splitlines()) == len(queries) + 1
+        return _timed(run_batch, repeat)
+
+    def bench_compare_bulk(self, repeat: int) -> dict:
+        ids = self.document_ids[:5]
+        return _timed(lambda: self.http.post("/api/compare_bulk", json={"document_ids": ids}), repeat)
+
+    def bench_feed(self, repeat: int) -> dict:
+        for i in range(50):
+            search_service.record_search("bench_user", f"topic {i}")
+        return _timed(lambda: self.http.get("/api/feed", params={"user_id": "bench_user"}), repeat)
+
+    def bench_search_history_writes(self, repeat: int) -> dict:
+        counter = iter(range(10 ** 9))
+        return _timed(lambda: search_service.record_interaction("bench_user", str(next(counter)), "Cloud computing"), repeat)
+
+    def run(self, repeat: int) -> dict:
+        results = {}
+        with mock.patch("services.search_service.requests.get", fake_wikipedia_get):
+            results["ingestion"] = self.bench_ingestion(max(2, repeat // 5))
+            results["query"] = self.bench_query(repeat)
+            results["query_batch"] = self.bench_query_batch(repeat)
+            results["compare_bulk"] = self.bench_compare_bulk(repeat)
+            results["feed"] = self.bench_feed(repeat)
+            results["search_history_writes"] = self.bench_search_history_writes(repeat * 5)
+        return results
+
+def check_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns a message for every case whose p50 grew past threshold x baseline, or that did not run."""
+    failures = [f"{case}: missing from this run" for case in baseline.get("results", {}) if case not in results]
+    for case, stats in results.items():
+        previous = baseline.get("results", {}).get(case)
+        if not previous or not previous.get("p50_ms"):
+            continue
+        ratio = stats["p50_ms"] / previous["p50_ms"]
+        stats["vs_baseline"] = round(ratio, 3)
+        if ratio > threshold:
+            failures.append(f"{case}: p50 {stats['p50_ms']}ms vs baseline {previous['p50_ms']}ms ({ratio:.2f}x > {threshold}x)")
+    return failures
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline ResearchPilot backend benchmarks")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per case")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated Gemini generation latency")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed p50 slowdown ratio in baseline mode")
+    args = parser.parse_args(argv)
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                suite = BenchmarkSuite(args.llm_latency_ms)
+            except FileNotFoundError as e:
+                print(f"ERROR {e}", file=sys.stderr)
+                return 2
+            results = suite.run(args.repeat)
+        report = {
+            "python": sys.version.split()[0],
+            "repeat": args.repeat,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_calls": {
+                "embed": suite.fake_client.models.embed_calls,
+                "generate": suite.fake_client.models.generate_calls,
+            },
+            "results": results,
+        }
+
+        failures = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                failures = check_regressions(results, json.load(f), args.threshold)
+            report["regressions"] = failures
+
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output)
+        else:
+            print(output)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(_scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,111 @@
+"""Multi-worker stress test for the coordination layer.
+
+Spawns N worker processes that share one data directory (file coordination
+backend), one document store and one LLM call log. All workers request the
+same document's summary, mindmap and podcast at the same moment and append
+search-history events concurrently. The run passes when every artifact (and
+each artifact it is built from) was generated exactly once and no history event was lost.
+
+    python -m benchmarks.stress_workers --workers 8 --searches 25
+    python -m benchmarks.stress_workers --unsafe   # disable single-flight to see duplicates
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+DOCUMENT_ID = "stress-doc"
+ARTIFACTS = ("summary", "mindmap", "podcast")
+
+def _configure_env(scratch: str):
+    os.environ["UPLOAD_DIR"] = os.path.join(scratch, "uploads")
+    os.environ["CHROMA_DB_PATH"] = os.path.join(scratch, "chroma")
+    os.environ["COORDINATION_DIR"] = os.path.join(scratch, "coordination")
+    os.environ["COORDINATION_BACKEND"] = "file"
+    os.environ["GEMINI_API_KEY"] = ""
+
+def _worker(scratch: str, barrier, searches: int, llm_latency_ms: float, unsafe: bool):
+    _configure_env(scratch)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        from benchmarks.fakes import CountingGenAIClient, FakeChromaCollection, FileCollection
+        from services.artifact_service import artifact_service
+        from services.audio_service import audio_service
+        from services.coordination_service import coordination_service
+        from services.db_service import db_service
+        from services.rag_service import rag_service
+        from services.search_service import search_service
+
+        rag_service.client = CountingGenAIClient(os.path.join(scratch, "llm_calls.log"), llm_latency_ms)
+        rag_service.collection = FakeChromaCollection(["Cloud computing supports scalable e-learning platforms."] * 5)
+        db_service.docs_collection = FileCollection(os.path.join(scratch, "documents.json"))
+        audio_service.generate_podcast_audio = lambda script, document_id: os.devnull
+        if unsafe:
+            coordination_service.single_flight = lambda key, timeout=None: contextlib.nullcontext()
+
+        barrier.wait()
+        for artifact in ARTIFACTS:
+            getattr(artifact_service, artifact)(DOCUMENT_ID)
+        for i in range(searches):
+            search_service.record_search(f"user-{os.getpid()}", f"query {i}")
+
+def run(workers: int, searches: int, llm_latency_ms: float, unsafe: bool) -> dict:
+    scratch = tempfile.mkdtemp(prefix="rp_stress_")
+    _configure_env(scratch)
+    os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+    with open(os.path.join(scratch, "documents.json"), "w") as f:
+        json.dump({DOCUMENT_ID: {"_id": DOCUMENT_ID, "id": DOCUMENT_ID, "filename": "stress.pdf", "status": "ready",
+                                 "full_text": "Cloud computing supports scalable e-learning platforms. " * 50}}, f)
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    processes = [ctx.Process(target=_worker, args=(scratch, barrier, searches, llm_latency_ms, unsafe)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from services.artifact_service import artifact_service
+    expected_llm_calls = len(artifact_service._with_dependencies(list(ARTIFACTS)))
+    try:
+        with open(os.path.join(scratch, "llm_calls.log")) as f:
+            llm_calls = len(f.read().splitlines())
+        with open(os.path.join(os.environ["UPLOAD_DIR"], "search_data.json")) as f:
+            recorded_searches = len(json.load(f)["searches"])
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "workers": workers,
+        "unsafe": unsafe,
+        "worker_exit_codes": [p.exitcode for p in processes],
+        "llm_calls": llm_calls,
+        "expected_llm_calls": expected_llm_calls,
+        "search_events": recorded_searches,
+        "expected_search_events": workers * searches,
+    }
+    report["passed"] = (
+        all(code == 0 for code in report["worker_exit_codes"])
+        and llm_calls == expected_llm_calls
+        and recorded_searches == workers * searches
+    )
+    return report
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Multi-worker coordination stress test")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--searches", type=int, default=25, help="history events written per worker")
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="simulated generation latency, widens the race window")
+    parser.add_argument("--unsafe", action="store_true", help="bypass single-flight locks for comparison")
+    args = parser.parse_args(argv)
+
+    report = run(args.workers, args.searches, args.llm_latency_ms, args.unsafe)
+    print(json.dumps(report, indent=2))
+    return 0 if report["passed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
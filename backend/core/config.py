@@ -7,6 +7,91 @@ class Settings(BaseSettings):
     CHROMA_DB_PATH: str = "./data/chroma_db"
     UPLOAD_DIR: str = "./data/uploads"
     MONGO_URI: str = "mongodb://localhost:27017/"
+    # Set to run Chroma as a server shared by all API workers instead of an in-process PersistentClient
+    CHROMA_HOST: str = ""
+    CHROMA_PORT: int = 8000
+    # Cross-worker locks and shared cache: "file" (single host) or "mongo" (multi-host)
+    COORDINATION_BACKEND: str = "file"
+    COORDINATION_DIR: str = "./data/coordination"
+    LOCK_TTL_SECONDS: int = 300
+    WIKIPEDIA_CACHE_SECONDS: int = 3600
+    # Tenant used when a request has no X-Tenant-ID header; it keeps the original "research_papers" collection
+    DEFAULT_TENANT: str = "default"
+    # Tenant credentials: maps an X-API-Key value to the tenant it acts as, e.g. {"<secret>": "acme"}.
+    # Requests without a key use DEFAULT_TENANT; X-Tenant-ID may only repeat the key's own tenant
+    TENANT_API_KEYS: dict[str, str] = {}
+    # Trust a bare X-Tenant-ID header. Only enable behind a gateway that authenticates callers and
+    # sets the header itself; otherwise any client could read another tenant's papers
+    TRUST_TENANT_HEADER: bool = False
+    # Per-tenant quotas, enforced per API worker process; 0 disables a limit
+    TENANT_QUOTAS: dict[str, dict[str, int]] = {
+        "ingest": {"per_minute": 10, "concurrent": 2},
+        "llm": {"per_minute": 30, "concurrent": 4},
+    }
+    # Quota overrides for individual tenants, e.g. {"acme": {"llm": {"per_minute": 120, "concurrent": 8}}}
+    TENANT_QUOTA_OVERRIDES: dict[str, dict[str, dict[str, int]]] = {}
+    # Background work (precompute, batch query groups) waits up to this long for an LLM slot instead of failing
+    QUOTA_WAIT_SECONDS: float = 30
+    # Two-stage retrieval: fetch RERANK_CANDIDATES chunks, rescore locally, keep at most RERANK_KEEP.
+    # Scorers: "bm25" (BM25 + vector similarity, weighted by RERANK_WEIGHTS), "cross_encoder"
+    # (needs sentence-transformers) or "none" for single-stage retrieval
+    RERANK_SCORER: str = "bm25"
+    RERANK_CANDIDATES: int = 20
+    RERANK_KEEP: int = 4
+    RERANK_WEIGHTS: dict[str, float] = {"bm25": 0.5, "vector": 0.5}
+    RERANK_CROSS_ENCODER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    # /api/query_batch: most queries per request, queries sharing one prompt, and concurrent prompts
+    QUERY_BATCH_MAX_QUERIES: int = 20
+    QUERY_BATCH_GROUP_SIZE: int = 4
+    QUERY_BATCH_CONCURRENCY: int = 4
+    # Long-poll change feed for document cards
+    DOCUMENT_CHANGES_MAX_WAIT_SECONDS: float = 25.0
+    DOCUMENT_CHANGES_POLL_SECONDS: float = 1.0
+    DOCUMENT_CHANGES_SETTLE_SECONDS: float = 1.0
+    # Shared secret for /api/admin and /api/metrics (X-Admin-Token or Authorization: Bearer); empty disables them
+    ADMIN_TOKEN: str = ""
+    # Corpus snapshots: rows per archive part, Chroma upsert batch size and restore parallelism
+    SNAPSHOT_DOCUMENTS_PER_PART: int = 500
+    SNAPSHOT_VECTORS_PER_PART: int = 5000
+    SNAPSHOT_CHROMA_BATCH: int = 1000
+    SNAPSHOT_RESTORE_WORKERS: int = 4
+    # Storage maintenance: background GC interval (0 disables), age before an unreferenced file counts as
+    # orphaned, and age after which an ingestion still "processing" is presumed dead
+    GC_INTERVAL_SECONDS: int = 6 * 3600
+    GC_GRACE_SECONDS: int = 3600
+    GC_STALE_PROCESSING_SECONDS: int = 2 * 3600
+    # Deleted documents leave a tombstone for the change feed this long; older cursors must reload the listing
+    GC_TOMBSTONE_SECONDS: int = 7 * 86400
+    # Search history older than this, or beyond the newest SEARCH_EVENTS_MAX per kind, is rolled up into daily counts
+    SEARCH_EVENT_RETENTION_DAYS: int = 90
+    SEARCH_EVENTS_MAX: int = 10000
+    # A local Chroma collection is rebuilt once its vector index is this many times the size its live vectors need
+    CHROMA_COMPACT_BLOAT_RATIO: float = 2.0
+    CHROMA_COMPACT_MIN_BYTES: int = 8 * 1024 * 1024
+    # Artifacts generated in the background right after ingestion (podcast also synthesizes audio, so it is opt-in)
+    PRECOMPUTE_ARTIFACTS: list[str] = ["section_summaries", "summary", "features", "mindmap"]
+    # Pause between background generations to leave rate-limit headroom for interactive requests
+    PRECOMPUTE_PAUSE_SECONDS: float = 2.0
+    # Bounds on generated mindmaps (depth counts the root level)
+    MINDMAP_MAX_NODES: int = 60
+    MINDMAP_MAX_DEPTH: int = 4
+    MINDMAP_MAX_CHILDREN: int = 8
+    # Prompt context budgets (estimated tokens) per generation endpoint
+    CONTEXT_TOKEN_BUDGETS: dict[str, int] = {
+        "default": 8000,
+        "section_summaries": 12000,
+        "query": 4000,
+        "query_batch": 8000,
+        "summary": 8000,
+        "podcast": 6000,
+        "video": 6000,
+        "compare": 60000,
+        "mindmap": 6000,
+        "compare_bulk": 1500,
+        "research_wiki": 30000,
+        "compare_wiki": 45000,
+        "translate": 30000,
+    }
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,153 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Latency buckets (seconds) spanning fast Mongo reads up to long LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans recorded while handling the current request, for the per-request timing log
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("request_spans", default=None)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    bucket_labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                bucket_labels = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self.stage_latency = self.histogram("researchpilot_stage_latency_seconds", "Latency of backend pipeline stages.", ("stage",))
+        self.request_latency = self.histogram("researchpilot_request_latency_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+        self.prompt_tokens = self.histogram(
+            "researchpilot_prompt_tokens", "Estimated prompt size per generation endpoint.", ("endpoint",),
+            buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+        )
+        self.cache_lookups = self.counter("researchpilot_cache_lookups_total", "Artifact cache lookups by result.", ("artifact", "result"))
+        self.llm_tokens = self.counter("researchpilot_llm_tokens_total", "Gemini tokens consumed.", ("endpoint", "direction"))
+        self.llm_rate_limited = self.counter("researchpilot_llm_rate_limited_total", "Gemini calls rejected with 429/RESOURCE_EXHAUSTED.", ("endpoint",))
+        self.stage_errors = self.counter("researchpilot_stage_errors_total", "Pipeline stages that raised.", ("stage",))
+        self.batch_context_tokens_saved = self.counter("researchpilot_batch_context_tokens_saved_total", "Context tokens not sent thanks to chunk sharing in batched queries.")
+        self.rerank_tokens_saved = self.counter("researchpilot_rerank_tokens_saved_total", "Context tokens dropped by reranking versus the plain top-k context.", ("endpoint",))
+        self.storage_reclaimed_bytes = self.counter("researchpilot_storage_reclaimed_bytes_total", "Disk space freed by document deletion and storage maintenance.", ("store",))
+        self.quota_rejections = self.counter("researchpilot_quota_rejections_total", "Requests rejected by a per-tenant quota.", ("tenant", "kind"))
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def cache_hit(self, artifact: str, hit: bool):
+        self.cache_lookups.inc(artifact=artifact, result="hit" if hit else "miss")
+
+    def render(self) -> str:
+        """Prometheus text exposition of every registered metric."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def span(self, stage: str):
+        """Times a block as one pipeline stage and attributes it to the current request."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_latency.observe(elapsed, stage=stage)
+            spans = _request_spans.get()
+            if spans is not None:
+                spans.append((stage, elapsed))
+
+    def begin_request(self) -> contextvars.Token:
+        return _request_spans.set([])
+
+    def end_request(self, token: contextvars.Token) -> List[Tuple[str, float]]:
+        """Stops collecting spans in this context and returns the request's span list.
+
+        Work still producing a streamed response body keeps appending to the
+        returned list, so read it with stage_totals() once the body is sent.
+        """
+        spans = _request_spans.get()
+        _request_spans.reset(token)
+        return [] if spans is None else spans
+
+    def stage_totals(self, spans: List[Tuple[str, float]]) -> Dict[str, float]:
+        """Total milliseconds per stage."""
+        totals: Dict[str, float] = {}
+        for stage, elapsed in spans:
+            totals[stage] = totals.get(stage, 0) + elapsed * 1000
+        return {stage: round(ms, 2) for stage, ms in totals.items()}
+
+metrics = MetricsRegistry()
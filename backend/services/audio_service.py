@@ -1,6 +1,6 @@
 import os
-from gtts import gTTS
 from core.config import settings
+from core.metrics import metrics
 
 class AudioService:
     def __init__(self):
@@ -11,8 +11,10 @@ class AudioService:
         """Converts text script into an audio file using gTTS."""
         output_path = os.path.join(self.audio_dir, f"{document_id}.mp3")
         try:
-            tts = gTTS(text=script_text, lang='en', slow=False)
-            tts.save(output_path)
+            from gtts import gTTS
+            with metrics.span("tts"):
+                tts = gTTS(text=script_text, lang='en', slow=False)
+                tts.save(output_path)
             return output_path
         except Exception as e:
             print(f"Error generating audio: {e}")
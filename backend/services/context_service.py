@@ -0,0 +1,134 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+
+# Rough sub-word split used for token estimation: words, numbers and single punctuation marks
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PAGE_NUMBER_LINE = re.compile(r"^\s*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_REFERENCES_HEADING = re.compile(r"^\s*(\d+\.?\s*)?(references|bibliography|works cited)\s*:?\s*$", re.IGNORECASE | re.MULTILINE)
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s")
+
+class ContextService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompt_stats: Dict[str, Dict[str, int]] = {}
+
+    def count_tokens(self, text: str) -> int:
+        """Estimates the Gemini token count of a text without a network round trip.
+
+        Long words count as several sub-word tokens. This is a heuristic, not the
+        real tokenizer; it is only meant for comparing prompts against budgets.
+        """
+        if not text:
+            return 0
+        return sum(1 + len(piece) // 6 for piece in _TOKEN_PATTERN.findall(text))
+
+    def budget_for(self, endpoint: str) -> int:
+        """Returns the configured context token budget for a generation endpoint."""
+        return settings.CONTEXT_TOKEN_BUDGETS.get(endpoint, settings.CONTEXT_TOKEN_BUDGETS["default"])
+
+    def strip_boilerplate(self, text: str) -> str:
+        """Removes running headers/footers, page numbers and the reference list from extracted PDF text."""
+        if not text:
+            return ""
+
+        # Cut the trailing reference section (only if the heading sits in the back half of the paper)
+        last_heading = None
+        for match in _REFERENCES_HEADING.finditer(text):
+            last_heading = match
+        if last_heading and last_heading.start() > len(text) * 0.5:
+            text = text[:last_heading.start()]
+
+        lines = text.split("\n")
+        # Short lines repeated on many pages are running headers/footers
+        keys = [" ".join(line.split()) for line in lines]
+        counts = Counter(key for key in keys if 0 < len(key) <= 120)
+        repeated = {key for key, n in counts.items() if n >= 3 and len(key.split()) <= 15}
+
+        kept = []
+        for line, key in zip(lines, keys):
+            if key in repeated or _PAGE_NUMBER_LINE.match(key):
+                continue
+            kept.append(line)
+
+        # Collapse the blank runs left behind by the removed lines
+        return re.sub(r"\n\s*\n(\s*\n)+", "\n\n", "\n".join(kept)).strip()
+
+    def fit_text(self, text: str, budget: int) -> str:
+        """Truncates text to a token budget, ending on a sentence boundary where possible."""
+        if not text or self.count_tokens(text) <= budget:
+            return text or ""
+
+        # Start from a character estimate and shrink until the count fits
+        cut = min(len(text), budget * 4)
+        while cut > 0 and self.count_tokens(text[:cut]) > budget:
+            cut = int(cut * 0.9)
+        head = text[:cut]
+
+        boundary = None
+        for match in _SENTENCE_END.finditer(head):
+            boundary = match.end()
+        if boundary and boundary > cut * 0.8:
+            head = head[:boundary]
+        return head.rstrip()
+
+    def fit_document(self, text: str, budget: int) -> str:
+        """Cleans extracted paper text and fits it to a token budget."""
+        return self.fit_text(self.strip_boilerplate(text), budget)
+
+    def pack_chunks(self, chunks: List[str], budget: int, scores: Optional[List[float]] = None) -> List[str]:
+        """Greedily packs the highest-value chunks into a token budget.
+
+        Chunks are taken in score order (higher is better); without scores the input
+        order is treated as the ranking, which matches Chroma's nearest-first results.
+        Duplicates are skipped, and a chunk that does not fit is skipped rather than
+        ending the packing, so smaller lower-ranked chunks can still use the budget.
+        """
+        order = range(len(chunks))
+        if scores is not None:
+            order = sorted(order, key=lambda i: scores[i], reverse=True)
+
+        packed, seen, used = [], set(), 0
+        for i in order:
+            chunk = (chunks[i] or "").strip()
+            if not chunk or chunk in seen:
+                continue
+            cost = self.count_tokens(chunk)
+            if used + cost > budget:
+                continue
+            packed.append(chunk)
+            seen.add(chunk)
+            used += cost
+        return packed
+
+    def record_prompt(self, endpoint: str, prompt: str) -> int:
+        """Records the size of a prompt sent for an endpoint and returns its token estimate."""
+        tokens = self.count_tokens(prompt)
+        metrics.prompt_tokens.observe(tokens, endpoint=endpoint)
+        with self._lock:
+            stats = self._prompt_stats.setdefault(endpoint, {"prompts": 0, "total_tokens": 0, "max_tokens": 0})
+            stats["prompts"] += 1
+            stats["total_tokens"] += tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        print(json.dumps({
+            "event": "prompt",
+            "endpoint": endpoint,
+            "prompt_tokens": tokens,
+            "budget": self.budget_for(endpoint)
+        }))
+        return tokens
+
+    def get_prompt_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of prompt-size statistics per endpoint."""
+        with self._lock:
+            return {
+                endpoint: {**stats, "avg_tokens": stats["total_tokens"] // max(stats["prompts"], 1)}
+                for endpoint, stats in self._prompt_stats.items()
+            }
+
+context_service = ContextService()
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class LockTimeout(Exception):
+    """Raised when a single-flight lock cannot be acquired in time."""
+
+def _key_filename(key: str) -> str:
+    return hashlib.sha1(key.encode()).hexdigest()
+
+class FileLockBackend:
+    """Advisory OS file locks; coordinates workers sharing one host and data directory.
+
+    Locks are released by the kernel if a worker dies, so they never go stale.
+    A lock file is removed when its lock is released. On Windows, where an open
+    file cannot be removed, the files stay; there is one per lock key.
+    """
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self, fd: int):
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _is_current(self, fd: int, path: str) -> bool:
+        """Whether fd is still the file at path, i.e. no earlier holder removed it meanwhile."""
+        if not fcntl:
+            return True
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            return False
+        held = os.fstat(fd)
+        return (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino)
+
+    @contextmanager
+    def hold(self, key: str, timeout: float):
+        path = os.path.join(self.lock_dir, f"{_key_filename(key)}.lock")
+        deadline = time.monotonic() + timeout
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT)
+            try:
+                while not self._try_lock(fd):
+                    if time.monotonic() > deadline:
+                        raise LockTimeout(key)
+                    time.sleep(0.05)
+            except BaseException:
+                os.close(fd)
+                raise
+            if self._is_current(fd, path):
+                break
+            # The holder we waited on removed the file; lock whichever file is there now
+            self._unlock(fd)
+            os.close(fd)
+        try:
+            yield
+        finally:
+            if fcntl:
+                # Removed while still held, so anyone queued on this file retries on a fresh one
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self._unlock(fd)
+            os.close(fd)
+
+class MongoLockBackend:
+    """Lease-based locks in a Mongo collection; coordinates workers across hosts.
+
+    A lease expires after LOCK_TTL_SECONDS so a crashed worker cannot block others
+    forever; a live holder renews it every third of that from a heartbeat thread.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def _try_lock(self, key: str, owner: str) -> bool:
+        from datetime import datetime, timedelta, timezone
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.now(timezone.utc)
+        try:
+            # Takes the lease if it is free or expired; the upsert collides if another owner holds it
+            self.collection.update_one(
+                {"_id": key, "expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=settings.LOCK_TTL_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _renew(self, key: str, owner: str, released: threading.Event):
+        """Extends the lease while its holder is still working, so long work keeps the lock."""
+        from datetime import datetime, timedelta, timezone
+
+        while not released.wait(settings.LOCK_TTL_SECONDS / 3):
+            try:
+                renewed = self.collection.update_one(
+                    {"_id": key, "owner": owner},
+                    {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=settings.LOCK_TTL_SECONDS)}}
+                )
+                if not renewed.matched_count:
+                    print(f"Lease on {key} was lost before its holder finished")
+                    return
+            except Exception as e:
+                # Try again next beat; the lease only lapses if renewals keep failing for a full TTL
+                print(f"Lease renewal failed for {key}: {e}")
+
+    @contextmanager
+    def hold(self, key: str, timeout: float):
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self._try_lock(key, owner):
+            if time.monotonic() > deadline:
+                raise LockTimeout(key)
+            time.sleep(0.1)
+        released = threading.Event()
+        heartbeat = threading.Thread(target=self._renew, args=(key, owner, released), name="lock-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            released.set()
+            self.collection.delete_one({"_id": key, "owner": owner})
+
+class FileCacheBackend:
+    """JSON files in a shared directory, written atomically."""
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{_key_filename(key)}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] < time.time():
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: int):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, "expires_at": time.time() + ttl, "value": value}, f)
+        os.replace(tmp_path, path)
+
+class MongoCacheBackend:
+    """Cache entries in a Mongo collection, expired by a TTL index."""
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key: str) -> Optional[Any]:
+        from datetime import datetime, timezone
+
+        entry = self.collection.find_one({"_id": key})
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if not entry or entry["expires_at"].replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: int):
+        from datetime import datetime, timedelta, timezone
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self.collection.update_one({"_id": key}, {"$set": {"value": value, "expires_at": expires_at}}, upsert=True)
+
+class CoordinationService:
+    """Cross-worker locks and a shared cache tier.
+
+    COORDINATION_BACKEND selects "file" (one host, shared data directory) or
+    "mongo" (any number of hosts sharing MONGO_URI).
+    """
+    def __init__(self):
+        self._locks = None
+        self._cache = None
+        self._local_files = None
+        self._init_lock = threading.Lock()
+
+    def _build(self):
+        if settings.COORDINATION_BACKEND == "mongo":
+            from services.db_service import db_service
+            self._locks = MongoLockBackend(db_service.db["locks"])
+            self._cache = MongoCacheBackend(db_service.db["cache"])
+        else:
+            self._locks = FileLockBackend(os.path.join(settings.COORDINATION_DIR, "locks"))
+            self._cache = FileCacheBackend(os.path.join(settings.COORDINATION_DIR, "cache"))
+
+    def _backends(self):
+        if self._locks is None:
+            with self._init_lock:
+                if self._locks is None:
+                    self._build()
+        return self._locks, self._cache
+
+    @contextmanager
+    def single_flight(self, key: str, timeout: float = None):
+        """Holds a cross-worker lock on key; callers re-check their cached result once inside."""
+        locks, _ = self._backends()
+        with locks.hold(key, timeout if timeout is not None else settings.LOCK_TTL_SECONDS):
+            yield
+
+    @contextmanager
+    def file_lock(self, key: str, timeout: float = 30):
+        """Host-local lock for files on the local disk, regardless of the configured backend."""
+        if self._local_files is None:
+            self._local_files = FileLockBackend(os.path.join(settings.COORDINATION_DIR, "locks"))
+        with self._local_files.hold(key, timeout):
+            yield
+
+    def cache_get(self, key: str) -> Optional[Any]:
+        _, cache = self._backends()
+        try:
+            return cache.get(key)
+        except Exception as e:
+            print(f"Shared cache read failed for {key}: {e}")
+            return None
+
+    def cache_set(self, key: str, value: Any, ttl: int):
+        _, cache = self._backends()
+        try:
+            cache.set(key, value, ttl)
+        except Exception as e:
+            print(f"Shared cache write failed for {key}: {e}")
+
+coordination_service = CoordinationService()
@@ -1,43 +1,211 @@
-from pymongo import MongoClient
+import base64
+import json
+import re
+import threading
+import time
 from core.config import settings
+from core.metrics import metrics
+from services.tenant_service import tenant_service
+
+# Fields shown on a dashboard card; listings never load artifacts or text
+CARD_FIELDS = {"filename": 1, "status": 1, "extracted_length": 1, "created_at": 1, "updated_at": 1}
 
 class DBService:
     def __init__(self):
-        try:
-            self.client = MongoClient(settings.MONGO_URI, serverSelectionTimeoutMS=5000)
-            self.db = self.client["researchpilot_db"]
-            self.docs_collection = self.db["documents"]
-            # Test connection
-            self.client.server_info()
-            print("Successfully connected to MongoDB.")
-        except Exception as e:
-            print(f"Failed to connect to MongoDB: {e}")
-
-    def save_document(self, doc_data: dict):
-        """Save or update a document record. Expects an 'id' field in dict."""
+        # The Mongo client is created on first use; MongoClient itself connects in
+        # the background, so nothing here blocks on the server being reachable
+        self._client = None
+        self._docs_collection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        from pymongo import MongoClient
+        self._client = MongoClient(settings.MONGO_URI, serverSelectionTimeoutMS=5000)
+        self._db = self._client["researchpilot_db"]
+        self._docs_collection = self._db["documents"]
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        self.client
+        return self._db
+
+    @property
+    def docs_collection(self):
+        if self._docs_collection is None:
+            self.client
+        return self._docs_collection
+
+    @docs_collection.setter
+    def docs_collection(self, value):
+        self._docs_collection = value
+
+    def ping(self):
+        """Round-trips to the server and ensures indexes; raises if Mongo is unreachable."""
+        self.client.admin.command("ping")
+        # Every query is scoped to a tenant; content-hash lookups back per-tenant upload deduplication
+        self.docs_collection.create_index("tenant_id")
+        self.docs_collection.create_index([("tenant_id", 1), ("content_hash", 1)], sparse=True)
+        # Listing order, listing filters and the change feed
+        self.docs_collection.create_index([("tenant_id", 1), ("created_at", -1), ("_id", -1)])
+        self.docs_collection.create_index([("tenant_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)])
+        self.docs_collection.create_index([("tenant_id", 1), ("filename_key", 1)])
+        self.docs_collection.create_index([("tenant_id", 1), ("updated_at", 1)])
+        self._backfill_listing_fields()
+
+    def _backfill_listing_fields(self):
+        """Gives records stored before paginated listings the fields those queries sort and filter on."""
+        for doc in self.docs_collection.find({"created_at": {"$exists": False}}, {"filename": 1}):
+            self.docs_collection.update_one({"_id": doc["_id"]}, {"$set": {
+                "created_at": 0,
+                "updated_at": 0,
+                "filename_key": (doc.get("filename") or "").lower()
+            }})
+
+    def _scoped(self, query: dict, include_deleted: bool = False) -> dict:
+        """Restricts a query to the current tenant's documents, skipping deletion tombstones."""
+        if not include_deleted:
+            query = {"$and": [query, {"status": {"$ne": "deleted"}}]} if "status" in query else {**query, "status": {"$ne": "deleted"}}
+        tenant_id = tenant_service.current()
+        if tenant_service.is_default(tenant_id):
+            # Records stored before tenancy existed have no tenant_id and belong to the default tenant
+            return {**query, "tenant_id": {"$in": [tenant_id, None]}}
+        return {**query, "tenant_id": tenant_id}
+
+    def save_document(self, doc_data: dict, upsert: bool = True):
+        """Save or update a document record. Expects an 'id' field in dict.
+
+        With upsert=False only an existing record is updated, so work finishing
+        after a document was deleted cannot bring a partial record back.
+        """
         doc_data["_id"] = doc_data["id"] # Use the UUID as Mongo's primary key
-        self.docs_collection.update_one(
-            {"_id": doc_data["id"]},
-            {"$set": doc_data},
-            upsert=True
-        )
+        now = time.time()
+        doc_data["updated_at"] = now
+        if "filename" in doc_data:
+            doc_data["filename_key"] = (doc_data["filename"] or "").lower()
+        with metrics.span("mongo_write"):
+            # A tombstone never matches, so late work cannot revive a deleted document
+            self.docs_collection.update_one(
+                {"_id": doc_data["id"], "status": {"$ne": "deleted"}},
+                {"$set": doc_data, "$setOnInsert": {"tenant_id": tenant_service.current(), "created_at": now}},
+                upsert=upsert
+            )
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Replaces a record of the current tenant with a tombstone; returns whether one existed.
+
+        The tombstone keeps only the id, tenant and timestamps, with status
+        "deleted", so the change feed can report the deletion; GC purges it
+        after GC_TOMBSTONE_SECONDS.
+        """
+        with metrics.span("mongo_write"):
+            existing = self.docs_collection.find_one(self._scoped({"_id": doc_id}), {"tenant_id": 1, "created_at": 1})
+            if not existing:
+                return False
+            tombstone = {"id": doc_id, "status": "deleted", "updated_at": time.time(), **existing}
+            return self.docs_collection.replace_one(self._scoped({"_id": doc_id}), tombstone).matched_count > 0
+
+    def purge_tombstones(self, before: float) -> int:
+        """Deletes tombstones of documents deleted before `before`, across all tenants."""
+        with metrics.span("mongo_write"):
+            return self.docs_collection.delete_many({"status": "deleted", "updated_at": {"$lt": before}}).deleted_count
 
     def get_document(self, doc_id: str) -> dict:
         """Retrieve a single document by ID."""
-        doc = self.docs_collection.find_one({"_id": doc_id})
+        with metrics.span("mongo_read"):
+            doc = self.docs_collection.find_one(self._scoped({"_id": doc_id}))
         if doc and "id" not in doc:
             doc["id"] = doc["_id"]
         return doc
         
+    def get_document_by_hash(self, content_hash: str) -> dict:
+        """Find an existing, non-failed document with the same file content in the current tenant."""
+        with metrics.span("mongo_read"):
+            doc = self.docs_collection.find_one(
+                self._scoped({"content_hash": content_hash, "status": {"$nin": ["error", "failed"]}}),
+                {"full_text": 0}
+            )
+        if doc and "id" not in doc:
+            doc["id"] = doc["_id"]
+        return doc
+
     def get_all_documents(self) -> list:
         """Retrieve all summarized/metadata fields for the dashboard listing."""
         # Exclude large full_text fields from the initial listing to save memory
-        cursor = self.docs_collection.find({}, {"full_text": 0})
         docs = []
-        for doc in cursor:
-            if "id" not in doc:
-                doc["id"] = doc["_id"]
-            docs.append(doc)
+        with metrics.span("mongo_read"):
+            for doc in self.docs_collection.find(self._scoped({}), {"full_text": 0}):
+                if "id" not in doc:
+                    doc["id"] = doc["_id"]
+                docs.append(doc)
         return docs
 
+    def get_document_index(self) -> list:
+        """Id, tenant and status of every record across all tenants, for storage maintenance."""
+        with metrics.span("mongo_read"):
+            return list(self.docs_collection.find({}, {"tenant_id": 1, "status": 1, "updated_at": 1}))
+
+    def fail_stale_processing(self, before: float) -> int:
+        """Marks records stuck in "processing" since before as "error"; their ingestion died with its worker."""
+        with metrics.span("mongo_write"):
+            return self.docs_collection.update_many(
+                {"status": "processing", "updated_at": {"$lt": before}},
+                {"$set": {"status": "error", "updated_at": time.time()}}
+            ).modified_count
+
+    def _card(self, doc: dict) -> dict:
+        doc["id"] = doc.pop("_id")
+        return doc
+
+    def _encode_cursor(self, doc: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps([doc.get("created_at", 0), doc["id"]]).encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> tuple:
+        """Raises ValueError for a cursor this service did not issue."""
+        try:
+            created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return float(created_at), str(doc_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    def list_documents(self, limit: int = 50, cursor: str = None, status: str = None, filename: str = None) -> tuple:
+        """One page of dashboard cards, newest first.
+
+        Returns (cards, next_cursor); next_cursor is None on the last page. The
+        cursor encodes the last card's (created_at, id), so pages stay stable while
+        new documents arrive. filename matches a case-insensitive prefix.
+        """
+        query = {}
+        if status:
+            query["status"] = {"$in": status.split(",")}
+        if filename:
+            # An anchored regex on the lower-cased copy can walk the filename index
+            query["filename_key"] = {"$regex": "^" + re.escape(filename.lower())}
+        if cursor:
+            created_at, doc_id = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": doc_id}}
+            ]
+        with metrics.span("mongo_read"):
+            found = self.docs_collection.find(self._scoped(query), CARD_FIELDS) \
+                .sort([("created_at", -1), ("_id", -1)]).limit(limit + 1)
+            cards = [self._card(doc) for doc in found]
+        next_cursor = self._encode_cursor(cards[limit - 1]) if len(cards) > limit else None
+        return cards[:limit], next_cursor
+
+    def get_changes(self, since: float, until: float, limit: int = 100) -> list:
+        """Cards with since < updated_at <= until, oldest change first; deleted documents have status "deleted"."""
+        with metrics.span("mongo_read"):
+            found = self.docs_collection.find(self._scoped({"updated_at": {"$gt": since, "$lte": until}}, include_deleted=True), CARD_FIELDS) \
+                .sort("updated_at", 1).limit(limit)
+            return [self._card(doc) for doc in found]
+
 db_service = DBService()
@@ -1,51 +1,224 @@
+import hashlib
 import os
+import re
 import uuid
-import pymupdf
+from collections import Counter
 from fastapi import UploadFile
 from typing import Dict, Any, List
 
 from core.config import settings
+from core.metrics import metrics
+
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Fraction of the page height treated as header/footer margin
+_MARGIN_RATIO = 0.1
+_REFERENCES_TITLE = re.compile(r"^\s*(\d+\.?\s*)?(references|bibliography|works cited)\b", re.IGNORECASE)
+_PAGE_NUMBER = re.compile(r"^\s*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_NUMBERED_PREFIX = re.compile(r"^\d{1,2}(\.\d{1,2})*\.?$")
+# Section titles papers conventionally leave unnumbered
+_UNNUMBERED_TITLE = re.compile(r"^(abstract|acknowledge?ments?|references|bibliography|works cited|appendix( [a-z0-9]+)?)\s*:?$", re.IGNORECASE)
 
 class DocumentService:
     def __init__(self):
         # Ensure upload directory exists
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-    async def save_upload_file(self, file: UploadFile) -> str:
-        """Saves the uploaded file to disk and returns its unique ID (path)."""
+    async def save_upload_file(self, file: UploadFile) -> tuple[str, str, str]:
+        """Streams the uploaded file to disk, hashing it on the way.
+
+        Returns the saved path, its unique ID and the SHA-256 of the content.
+        """
         file_id = str(uuid.uuid4())
         ext = os.path.splitext(file.filename)[1] if file.filename else ".pdf"
         file_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{ext}")
-        
+
+        digest = hashlib.sha256()
         with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-            
-        return file_path, file_id
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+
+        return file_path, file_id, digest.hexdigest()
 
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extracts text from a given PDF file using PyMuPDF."""
         text = ""
         try:
-            doc = pymupdf.open(file_path)
-            for page in doc:
-                text += page.get_text()
+            import pymupdf
+            with metrics.span("pdf_extraction"):
+                doc = pymupdf.open(file_path)
+                for page in doc:
+                    text += page.get_text()
             return text
         except Exception as e:
             print(f"Error extracting text from {file_path}: {e}")
             return ""
 
+    def _read_lines(self, doc) -> List[Dict[str, Any]]:
+        """Flattens PyMuPDF block/line/span output into lines with font and position info."""
+        lines = []
+        for page in doc:
+            height = page.rect.height or 1
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    spans = [s for s in line["spans"] if s["text"].strip()]
+                    text = " ".join("".join(s["text"] for s in line["spans"]).split())
+                    if not spans or not text:
+                        continue
+                    lines.append({
+                        "page": page.number,
+                        "block": block["number"],
+                        "text": text,
+                        "size": max(s["size"] for s in spans),
+                        "bold": all(s["flags"] & 16 for s in spans),
+                        "chars": sum(len(s["text"].strip()) for s in spans),
+                        "in_margin": line["bbox"][1] < height * _MARGIN_RATIO or line["bbox"][3] > height * (1 - _MARGIN_RATIO),
+                    })
+        return lines
+
+    def _find_running_lines(self, lines: List[Dict[str, Any]], page_count: int) -> set:
+        """Returns the normalized keys of header/footer lines repeated across pages."""
+        pages_per_key: Dict[str, set] = {}
+        for line in lines:
+            if line["in_margin"]:
+                key = re.sub(r"\d+", "#", line["text"].lower())
+                pages_per_key.setdefault(key, set()).add(line["page"])
+        threshold = max(2, page_count // 2)
+        return {key for key, pages in pages_per_key.items() if len(pages) >= threshold}
+
+    def _is_heading(self, line: Dict[str, Any], body_size: float) -> bool:
+        """A short line set in a larger font, or a bold one that is numbered or a conventional section title.
+
+        Bold alone is not enough: papers also bold terms and run-in labels inside paragraphs.
+        """
+        words = line["text"].split()
+        if len(words) > 12 or not any(c.isalpha() for c in line["text"]):
+            if not _NUMBERED_PREFIX.match(line["text"]):
+                return False
+        if line["text"].endswith(".") and not _NUMBERED_PREFIX.match(words[-1]):
+            return False
+        if line["size"] >= body_size + 1.5:
+            return True
+        return line["bold"] and bool(_NUMBERED_PREFIX.match(words[0]) or _UNNUMBERED_TITLE.match(line["text"]))
+
+    def _join_line(self, paragraph: str, text: str) -> str:
+        """Appends a line to a paragraph, undoing end-of-line hyphenation."""
+        if not paragraph:
+            return text
+        if paragraph.endswith("-") and text[:1].islower() and paragraph[-2:-1].isalpha():
+            return paragraph[:-1] + text
+        return f"{paragraph} {text}"
+
+    def extract_structured(self, file_path: str) -> Dict[str, Any]:
+        """Extracts cleaned, sectioned text from a PDF.
+
+        Running headers/footers and page numbers are dropped, hyphenated line
+        breaks are rejoined, headings are detected from font size, weight and numbering, and the
+        reference list is split off. Returns the body text together with section
+        and page offset maps into it.
+        """
+        try:
+            import pymupdf
+            with metrics.span("pdf_extraction"):
+                doc = pymupdf.open(file_path)
+                lines = self._read_lines(doc)
+                page_count = len(doc)
+        except Exception as e:
+            print(f"Error extracting structure from {file_path}: {e}")
+            return {"text": "", "sections": [], "references": "", "page_map": [], "stats": {}}
+
+        running = self._find_running_lines(lines, page_count)
+        size_weights = Counter()
+        for line in lines:
+            size_weights[round(line["size"], 1)] += line["chars"]
+        body_size = size_weights.most_common(1)[0][0] if size_weights else 0
+
+        # Group the surviving lines into (heading | paragraph) items
+        items: List[Dict[str, Any]] = []
+        removed = 0
+        for line in lines:
+            key = re.sub(r"\d+", "#", line["text"].lower())
+            if line["in_margin"] and (key in running or _PAGE_NUMBER.match(line["text"])):
+                removed += 1
+                continue
+            kind = "heading" if self._is_heading(line, body_size) else "paragraph"
+            last = items[-1] if items else None
+            if kind == "paragraph" and line["bold"] and last and last["kind"] == "heading" \
+                    and last["block"] == line["block"] and last["page"] == line["page"]:
+                # A long heading wrapped onto the next line of its block
+                kind = "heading"
+            if last and last["kind"] == kind and last["block"] == line["block"] and last["page"] == line["page"]:
+                last["text"] = self._join_line(last["text"], line["text"])
+            elif last and kind == "heading" and last["kind"] == "heading" and abs(last["size"] - line["size"]) < 0.5:
+                # Multi-line titles are often laid out as one block per line
+                last["text"] = self._join_line(last["text"], line["text"])
+            elif last and kind == "paragraph" and last["kind"] == "paragraph" and last["text"].endswith("-"):
+                # Hyphenated word split across a column or page break
+                last["text"] = self._join_line(last["text"], line["text"])
+            else:
+                items.append({"kind": kind, "text": line["text"], "page": line["page"], "block": line["block"], "size": line["size"]})
+
+        # Lay the items out as sections, isolating the reference list
+        parts: List[str] = []
+        sections: List[Dict[str, Any]] = []
+        page_spans: Dict[int, List[int]] = {}
+        references: List[str] = []
+        in_references = False
+        offset = 0
+
+        def append(text: str, page: int):
+            nonlocal offset
+            start = offset
+            parts.append(text)
+            offset += len(text) + 2
+            span = page_spans.setdefault(page, [start, start])
+            span[1] = start + len(text)
+            return start
+
+        for item in items:
+            if item["kind"] == "heading" and _REFERENCES_TITLE.match(item["text"]):
+                in_references = True
+                continue
+            if in_references:
+                references.append(item["text"])
+                continue
+            if item["kind"] == "heading":
+                if sections:
+                    sections[-1]["end"] = offset - 2
+                sections.append({"title": item["text"], "page": item["page"] + 1, "start": append(item["text"], item["page"])})
+                continue
+            if not sections:
+                sections.append({"title": "Front Matter", "page": item["page"] + 1, "start": offset})
+            append(item["text"], item["page"])
+
+        text = "\n\n".join(parts)
+        if sections:
+            sections[-1]["end"] = len(text)
+
+        raw_chars = sum(line["chars"] for line in lines)
+        return {
+            "text": text,
+            "sections": sections,
+            "references": "\n".join(references),
+            "page_map": [{"page": page + 1, "start": span[0], "end": span[1]} for page, span in sorted(page_spans.items())],
+            "stats": {
+                "pages": page_count,
+                "raw_chars": raw_chars,
+                "body_chars": len(text),
+                "reference_chars": sum(len(r) for r in references),
+                "removed_running_lines": removed,
+            },
+        }
+
     def process_document(self, file_path: str, file_name: str, file_id: str) -> Dict[str, Any]:
-        """Main orchestrator for processing a new document."""
-        text = self.extract_text_from_pdf(file_path)
-        
-        # Here we would also trigger chunking and vector storage
-        # (This will be implemented in the Vector/RAG service module)
-        
+        """Main orchestrator for processing a new document: extracts its structure once."""
+        structure = self.extract_structured(file_path)
+
         return {
             "document_id": file_id,
             "filename": file_name,
-            "extracted_length": len(text)
+            "extracted_length": len(structure["text"]),
+            "structure": structure
         }
 
 document_service = DocumentService()
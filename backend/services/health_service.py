@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Dict, Any, Callable
+
+from core.config import settings
+from services.db_service import db_service
+from services.rag_service import rag_service
+
+# Minimum delay before a failed dependency is probed again by the readiness endpoint
+_RECHECK_INTERVAL_S = 10
+
+class HealthService:
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._dependencies: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending"} for name in ("mongo", "chroma", "gemini", "pdf")
+        }
+
+    def _check(self, name: str, probe: Callable[[], None]):
+        start = time.perf_counter()
+        try:
+            probe()
+            state = {"status": "ready"}
+        except Exception as e:
+            state = {"status": "error", "error": str(e)[:200]}
+        state["checked_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        state["checked_at"] = time.time()
+        with self._lock:
+            self._dependencies[name] = state
+
+    def _probe_gemini(self):
+        if not settings.GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY not configured")
+        rag_service.client
+
+    def _probe_pdf(self):
+        import pymupdf  # noqa: F401
+
+    def warm_up(self):
+        """Opens every dependency once so the first real request does not pay for it.
+
+        Runs in a background thread at start-up; failures are recorded, not raised,
+        and the services retry on their next use.
+        """
+        self._check("chroma", lambda: rag_service.collection.count())
+        self._check("gemini", self._probe_gemini)
+        self._check("pdf", self._probe_pdf)
+        self._check("mongo", db_service.ping)
+        print(f"Warm-up finished: {self.dependencies()}")
+
+    def start_warm_up(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _recheck_in_background(self, name: str):
+        """Re-probes a failed dependency without blocking the caller."""
+        probes = {
+            "mongo": db_service.ping,
+            "chroma": lambda: rag_service.collection.count(),
+        }
+        with self._lock:
+            self._dependencies[name]["status"] = "retrying"
+        threading.Thread(target=self._check, args=(name, probes[name]), daemon=True).start()
+
+    def dependencies(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(state) for name, state in self._dependencies.items()}
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "uptime_s": round(time.time() - self.started_at, 1)}
+
+    def readiness(self) -> Dict[str, Any]:
+        """Ready once the stores needed to serve documents (Mongo and Chroma) are reachable."""
+        dependencies = self.dependencies()
+        for name in ("mongo", "chroma"):
+            state = dependencies[name]
+            if state["status"] == "error" and time.time() - state["checked_at"] > _RECHECK_INTERVAL_S:
+                self._recheck_in_background(name)
+        ready = all(dependencies[name]["status"] == "ready" for name in ("mongo", "chroma"))
+        return {"ready": ready, "dependencies": dependencies}
+
+health_service = HealthService()
@@ -0,0 +1,396 @@
+import glob
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.audio_service import audio_service
+from services.coordination_service import coordination_service, LockTimeout
+from services.db_service import db_service
+from services.rag_service import rag_service
+from services.search_service import search_service
+from services.tenant_service import tenant_service
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+_DEAD_STATUSES = ("error", "failed", "deleted")
+# Held by anything that must not run while orphans are collected (GC itself, snapshot restores)
+MAINTENANCE_LOCK = "storage_maintenance"
+# Chroma deletes take an id list; keep each call's where clause small
+_DELETE_BATCH = 500
+
+class MaintenanceBusy(Exception):
+    """Raised when another worker is already running storage maintenance."""
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class MaintenanceService:
+    """Deletes documents and keeps every store proportional to the live documents.
+
+    A document's data is spread over its Mongo record, its chunks in the
+    tenant's Chroma collection, the uploaded PDF and the podcast mp3.
+    delete_document() removes all of it; gc() reconciles the stores against
+    Mongo and removes what no live document owns:
+
+    - records stuck in "processing" after their worker died are marked "error"
+    - tombstones of deleted documents older than GC_TOMBSTONE_SECONDS
+    - chunks and uploads of missing, failed or errored documents
+    - audio without a record, stale temp files and expired shared-cache entries
+    - search history beyond its retention window (rolled up, see search_service)
+    - local Chroma storage: bloated vector indexes are rebuilt, segment
+      directories of deleted collections removed and the sqlite file vacuumed
+
+    Files younger than GC_GRACE_SECONDS are left alone, since uploads and audio
+    reach disk before their record does. Every run reports the bytes reclaimed.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def _remove(self, path: str, store: str) -> int:
+        """Deletes a file or directory and returns the bytes freed."""
+        try:
+            size = _path_size(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            return 0
+        metrics.storage_reclaimed_bytes.inc(size, store=store)
+        return size
+
+    def _document_files(self, document_id: str) -> List[str]:
+        uploads = [p for p in glob.glob(os.path.join(settings.UPLOAD_DIR, glob.escape(document_id) + ".*")) if os.path.isfile(p)]
+        audio = os.path.join(audio_service.audio_dir, f"{document_id}.mp3")
+        return uploads + ([audio] if os.path.exists(audio) else [])
+
+    def _delete_chunks(self, collection, document_ids: Iterable[str]) -> int:
+        document_ids = list(document_ids)
+        deleted = 0
+        for start in range(0, len(document_ids), _DELETE_BATCH):
+            where = {"document_id": {"$in": document_ids[start:start + _DELETE_BATCH]}}
+            with metrics.span("chroma_delete"):
+                deleted += len(collection.get(where=where, include=[])["ids"])
+                collection.delete(where=where)
+        return deleted
+
+    def delete_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Deletes one of the current tenant's documents from every store; None if it does not exist.
+
+        The record goes first, so the document disappears at once and anything a
+        crash leaves behind is an orphan the next gc() collects. An ingestion still
+        running for it only leaves orphaned chunks too: its final save no longer
+        upserts.
+        """
+        if not db_service.delete_document(document_id):
+            return None
+        chunks = self._delete_chunks(rag_service.collection, [document_id])
+        reclaimed = 0
+        for path in self._document_files(document_id):
+            reclaimed += self._remove(path, "audio" if path.endswith(".mp3") else "uploads")
+        report = {"document_id": document_id, "deleted": True, "chunks_deleted": chunks, "reclaimed_bytes": reclaimed}
+        print(json.dumps({"event": "document_deleted", "tenant_id": tenant_service.current(), **report}))
+        return report
+
+    # --- Garbage collection ---
+
+    def _is_old(self, path: str, now: float) -> bool:
+        try:
+            return now - os.path.getmtime(path) > settings.GC_GRACE_SECONDS
+        except OSError:
+            return False
+
+    def _live_documents(self, index: List[dict], live: Dict[str, set]):
+        for doc in index:
+            if doc.get("status") not in _DEAD_STATUSES:
+                name = tenant_service.collection_name(doc.get("tenant_id") or settings.DEFAULT_TENANT)
+                live.setdefault(name, set()).add(doc["_id"])
+
+    def _collect_chunks(self, index: List[dict], report: Dict[str, Any]):
+        """Deletes chunks whose document is missing or failed, per tenant collection."""
+        owners: Dict[str, set] = {}
+        for name in rag_service.collection_names():
+            collection = rag_service.open_collection(name)
+            owners[name], offset = set(), 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=settings.SNAPSHOT_VECTORS_PER_PART, offset=offset)
+                if not page["ids"]:
+                    break
+                owners[name].update(m.get("document_id") for m in page["metadatas"] if m and m.get("document_id"))
+                offset += len(page["ids"])
+
+        # Records are saved before their chunks are written, so reading the index again
+        # after listing owners covers documents uploaded while the collections were scanned
+        live: Dict[str, set] = {}
+        self._live_documents(index, live)
+        self._live_documents(db_service.get_document_index(), live)
+
+        for name, chunk_owners in owners.items():
+            collection = rag_service.open_collection(name)
+            dead = chunk_owners - live.get(name, set())
+            if dead:
+                report["chunks_deleted"] += self._delete_chunks(collection, dead)
+                report["documents_purged_from_index"] += len(dead)
+            # A tenant without documents or chunks does not need its own index
+            if name not in live and name != tenant_service.collection_name(settings.DEFAULT_TENANT) and collection.count() == 0:
+                rag_service.drop_collection(name)
+                report["collections_dropped"].append(name)
+
+    def _collect_files(self, index: List[dict], report: Dict[str, Any], now: float):
+        ids = {doc["_id"] for doc in index}
+        dead = {doc["_id"] for doc in index if doc.get("status") in _DEAD_STATUSES}
+        deleted = {doc["_id"] for doc in index if doc.get("status") == "deleted"}
+        reclaimed = report["reclaimed_bytes"]
+
+        for name in os.listdir(settings.UPLOAD_DIR):
+            path = os.path.join(settings.UPLOAD_DIR, name)
+            if not os.path.isfile(path) or not self._is_old(path, now):
+                continue
+            stem = name.split(".", 1)[0]
+            # Uploads are "<uuid><ext>"; failed ingestions have no retry, so their PDFs are dead weight too
+            orphaned_upload = _UUID.match(stem) and (stem not in ids or stem in dead)
+            if orphaned_upload or name.endswith(".tmp"):
+                reclaimed["uploads"] += self._remove(path, "uploads")
+                report["files_deleted"] += 1
+
+        for name in os.listdir(audio_service.audio_dir):
+            path = os.path.join(audio_service.audio_dir, name)
+            if not os.path.isfile(path) or not self._is_old(path, now):
+                continue
+            stem = name[:-len(".mp3")]
+            if name.endswith(".tmp") or (name.endswith(".mp3") and (stem not in ids or stem in deleted)):
+                reclaimed["audio"] += self._remove(path, "audio")
+                report["files_deleted"] += 1
+
+        # The file cache never deletes expired entries (the Mongo backend has a TTL index)
+        cache_dir = os.path.join(settings.COORDINATION_DIR, "cache")
+        if settings.COORDINATION_BACKEND == "file" and os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                path = os.path.join(cache_dir, name)
+                expired = name.endswith(".tmp") and self._is_old(path, now)
+                if name.endswith(".json"):
+                    try:
+                        with open(path) as f:
+                            expired = json.load(f)["expires_at"] < now
+                    except (OSError, ValueError, KeyError):
+                        expired = self._is_old(path, now)
+                if expired:
+                    reclaimed["cache"] += self._remove(path, "cache")
+                    report["files_deleted"] += 1
+
+    # --- Chroma compaction ---
+
+    def _sqlite_path(self) -> str:
+        return os.path.join(settings.CHROMA_DB_PATH, "chroma.sqlite3")
+
+    def _segment_ids(self, collection_id: str = None) -> set:
+        """Segment ids from Chroma's catalog; each vector segment persists to a directory of that name."""
+        with sqlite3.connect(self._sqlite_path(), timeout=60) as conn:
+            if collection_id is None:
+                rows = conn.execute("SELECT id FROM segments").fetchall()
+            else:
+                rows = conn.execute("SELECT id FROM segments WHERE collection = ?", (collection_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def _is_bloated(self, collection) -> bool:
+        # Deleted vectors stay in the HNSW index files as tombstones until the index is rebuilt
+        index_bytes = sum(_path_size(os.path.join(settings.CHROMA_DB_PATH, segment))
+                          for segment in self._segment_ids(str(collection.id)))
+        if index_bytes < settings.CHROMA_COMPACT_MIN_BYTES:
+            return False
+        sample = collection.get(limit=1, include=["embeddings"])
+        if not sample["ids"]:
+            return True
+        live_bytes = collection.count() * len(sample["embeddings"][0]) * 4
+        return index_bytes > settings.CHROMA_COMPACT_BLOAT_RATIO * live_bytes
+
+    def _ids(self, collection) -> set:
+        ids, offset = set(), 0
+        while True:
+            page = collection.get(include=[], limit=settings.SNAPSHOT_VECTORS_PER_PART, offset=offset)
+            if not page["ids"]:
+                return ids
+            ids.update(page["ids"])
+            offset += len(page["ids"])
+
+    def _copy_chunks(self, source, target, ids: List[str] = None) -> List[str]:
+        """Copies chunks (all of them, or the given ids) between collections; returns the ids copied."""
+        copied, offset = [], 0
+        while True:
+            if ids is None:
+                page = source.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=settings.SNAPSHOT_VECTORS_PER_PART, offset=offset)
+            else:
+                batch = ids[offset:offset + settings.SNAPSHOT_VECTORS_PER_PART]
+                page = source.get(ids=batch, include=["embeddings", "documents", "metadatas"]) if batch else {"ids": []}
+            if not page["ids"]:
+                return copied
+            with metrics.span("chroma_add"):
+                target.upsert(ids=page["ids"], embeddings=page["embeddings"],
+                              documents=page["documents"], metadatas=page["metadatas"])
+            copied += page["ids"]
+            offset += len(page["ids"]) if ids is None else settings.SNAPSHOT_VECTORS_PER_PART
+
+    def _rebuild(self, name: str) -> bool:
+        """Copies a collection's live chunks into a fresh index and swaps it in under the same name.
+
+        Ingestion and deletes do not stop for this, so after the swap the old
+        collection is compared with the ids copied: chunks added to it since are
+        copied over and chunks deleted from it since are deleted from the new one.
+        """
+        # Outside the "research_papers" prefix, so collection_names() never lists the copy as a tenant
+        staging_name = f"compact.{name}"
+        try:
+            rag_service.drop_collection(staging_name)
+        except Exception:
+            pass  # No copy left over from an interrupted run
+        staging = rag_service.open_collection(staging_name)
+        copied = set(self._copy_chunks(rag_service.open_collection(name), staging))
+        if staging.count() != len(copied):
+            rag_service.drop_collection(staging_name)
+            print(f"Compaction of {name} skipped: the copy is incomplete")
+            return False
+
+        retired_name = rag_service.replace_collection(name, staging_name)
+        retired, current = rag_service.open_collection(retired_name), rag_service.open_collection(name)
+        remaining = self._ids(retired)
+        self._copy_chunks(retired, current, sorted(remaining - copied))
+        deleted = sorted(copied - remaining)
+        for start in range(0, len(deleted), _DELETE_BATCH):
+            with metrics.span("chroma_delete"):
+                current.delete(ids=deleted[start:start + _DELETE_BATCH])
+        rag_service.drop_collection(retired_name)
+        return True
+
+    def compact_chroma(self) -> Dict[str, Any]:
+        """Rebuilds bloated local collections, removes orphaned segment files and vacuums the catalog."""
+        if settings.CHROMA_HOST or not os.path.exists(self._sqlite_path()):
+            return {"skipped": "Chroma runs as a server and manages its own storage"}
+        bytes_before = _path_size(settings.CHROMA_DB_PATH)
+        rebuilt = []
+        for name in rag_service.collection_names():
+            collection = rag_service.open_collection(name)
+            if self._is_bloated(collection) and self._rebuild(name):
+                rebuilt.append(name)
+
+        # Deleting a collection drops its catalog rows but not its index directory
+        segments = self._segment_ids()
+        orphaned = [entry for entry in os.listdir(settings.CHROMA_DB_PATH)
+                    if _UUID.match(entry) and entry not in segments
+                    and os.path.isdir(os.path.join(settings.CHROMA_DB_PATH, entry))]
+        for entry in orphaned:
+            shutil.rmtree(os.path.join(settings.CHROMA_DB_PATH, entry), ignore_errors=True)
+
+        vacuumed = True
+        try:
+            with metrics.span("chroma_vacuum"):
+                conn = sqlite3.connect(self._sqlite_path(), timeout=60)
+                try:
+                    conn.execute("VACUUM")
+                finally:
+                    conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"Chroma vacuum skipped: {e}")
+            vacuumed = False
+
+        bytes_after = _path_size(settings.CHROMA_DB_PATH)
+        reclaimed = max(0, bytes_before - bytes_after)
+        metrics.storage_reclaimed_bytes.inc(reclaimed, store="chroma")
+        return {"collections_rebuilt": rebuilt, "segments_removed": len(orphaned), "vacuumed": vacuumed,
+                "bytes_before": bytes_before, "bytes_after": bytes_after, "reclaimed_bytes": reclaimed}
+
+    def storage_usage(self) -> Dict[str, int]:
+        """Bytes on local disk per store."""
+        usage = {
+            "uploads": sum(os.path.getsize(os.path.join(settings.UPLOAD_DIR, n)) for n in os.listdir(settings.UPLOAD_DIR)
+                           if os.path.isfile(os.path.join(settings.UPLOAD_DIR, n)) and n != os.path.basename(search_service.db_path)),
+            "audio": _path_size(audio_service.audio_dir),
+            "search": _path_size(search_service.db_path),
+            "cache": _path_size(os.path.join(settings.COORDINATION_DIR, "cache")),
+        }
+        if not settings.CHROMA_HOST:
+            usage["chroma"] = _path_size(settings.CHROMA_DB_PATH)
+        return usage
+
+    def gc(self, wait: float = 0) -> Dict[str, Any]:
+        """Runs one reconciliation pass over every tenant's data and returns what it reclaimed.
+
+        Only one worker runs it at a time; raises MaintenanceBusy if another holds
+        the lock for longer than wait seconds.
+        """
+        started = time.perf_counter()
+        now = time.time()
+        report: Dict[str, Any] = {
+            "started_at": now,
+            "stale_ingestions_failed": 0,
+            "tombstones_purged": 0,
+            "documents_purged_from_index": 0,
+            "chunks_deleted": 0,
+            "collections_dropped": [],
+            "files_deleted": 0,
+            "reclaimed_bytes": {"uploads": 0, "audio": 0, "cache": 0, "search": 0, "chroma": 0},
+        }
+        try:
+            with coordination_service.single_flight(MAINTENANCE_LOCK, timeout=wait):
+                report["stale_ingestions_failed"] = db_service.fail_stale_processing(now - settings.GC_STALE_PROCESSING_SECONDS)
+                report["tombstones_purged"] = db_service.purge_tombstones(now - settings.GC_TOMBSTONE_SECONDS)
+                index = db_service.get_document_index()
+                self._collect_chunks(index, report)
+                self._collect_files(index, report, now)
+
+                history = search_service.rollup_history()
+                report["search_events_rolled_up"] = history["events_rolled_up"]
+                report["reclaimed_bytes"]["search"] = history["reclaimed_bytes"]
+                metrics.storage_reclaimed_bytes.inc(history["reclaimed_bytes"], store="search")
+
+                report["chroma"] = self.compact_chroma()
+                report["reclaimed_bytes"]["chroma"] = report["chroma"].get("reclaimed_bytes", 0)
+        except LockTimeout:
+            raise MaintenanceBusy("Storage maintenance is already running")
+
+        report["reclaimed_bytes_total"] = sum(report["reclaimed_bytes"].values())
+        report["storage_bytes"] = self.storage_usage()
+        report["seconds"] = round(time.perf_counter() - started, 2)
+        metrics.stage_latency.observe(report["seconds"], stage="storage_gc")
+        print(json.dumps({"event": "storage_gc", **report}))
+        self.last_report = report
+        return report
+
+    def _loop(self):
+        while True:
+            time.sleep(settings.GC_INTERVAL_SECONDS)
+            try:
+                self.gc()
+            except MaintenanceBusy:
+                pass
+            except Exception as e:
+                print(f"Storage maintenance failed: {e}")
+
+    def start(self):
+        """Starts the periodic background GC unless GC_INTERVAL_SECONDS is 0."""
+        if settings.GC_INTERVAL_SECONDS <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="storage-gc", daemon=True)
+                self._thread.start()
+
+maintenance_service = MaintenanceService()
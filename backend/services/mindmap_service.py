@@ -0,0 +1,173 @@
+import json
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from core.config import settings
+
+class MindmapParseError(ValueError):
+    """Raised when no usable mindmap can be recovered from the model output."""
+
+class IncrementalJSONParser:
+    """Consumes streamed JSON text and can close a truncated document at any point.
+
+    While feeding, it remembers the last position where a container had just been
+    opened or a nested value had just been closed, together with the containers
+    still open there. Cutting the text at that position and appending the missing
+    closers always yields valid JSON, so output that stops mid-string or mid-key
+    is repaired locally instead of being regenerated.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.objects = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._safe_end = 0
+        self._safe_stack: List[str] = []
+
+    def feed(self, piece: str):
+        offset = len(self.text)
+        self.text += piece
+        for i, char in enumerate(piece, start=offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+                if char == "{":
+                    self.objects += 1
+                self._mark_safe(i + 1)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                self._mark_safe(i + 1)
+
+    def _mark_safe(self, end: int):
+        self._safe_end = end
+        self._safe_stack = list(self._stack)
+
+    def result(self) -> Any:
+        """The parsed document, repaired if the stream ended early."""
+        # Skip anything before the first container, e.g. a markdown fence
+        starts = [i for i in (self.text.find("{"), self.text.find("[")) if i >= 0]
+        if not starts or not self._safe_end:
+            raise MindmapParseError("Model output contains no JSON object")
+        start = min(starts)
+        try:
+            return json.loads(self.text[start:])
+        except ValueError:
+            pass
+        head = self.text[start:self._safe_end].rstrip().rstrip(",")
+        try:
+            return json.loads(head + "".join(reversed(self._safe_stack)))
+        except ValueError as e:
+            raise MindmapParseError(f"Could not repair model output: {e}")
+
+class MindmapService:
+    """Builds bounded mindmap trees from paper section summaries with schema-constrained output."""
+
+    def response_schema(self) -> Dict[str, Any]:
+        """JSON schema for the tree, unrolled to the configured depth.
+
+        Gemini does not follow recursive references reliably, and unrolling makes the
+        depth limit part of the contract: the deepest level has no children key.
+        """
+        node: Dict[str, Any] = {
+            "type": "object",
+            "properties": {"name": {"type": "string"}},
+            "required": ["name"]
+        }
+        for _ in range(settings.MINDMAP_MAX_DEPTH - 1):
+            node = {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "children": {"type": "array", "items": node, "maxItems": settings.MINDMAP_MAX_CHILDREN}
+                },
+                "required": ["name", "children"]
+            }
+        return node
+
+    def prompt(self, title: str, section_summaries_text: str) -> str:
+        return f"""Generate a hierarchical JSON mind map of the research paper's core concepts from the section summaries below.
+The root node MUST be the paper title. It must have branches for Problem, Methodology, and Results.
+Keep labels short (a few words each). Use at most {settings.MINDMAP_MAX_NODES} nodes in total and at most {settings.MINDMAP_MAX_DEPTH} levels including the root.
+
+Paper: {title}
+
+Section Summaries:
+{section_summaries_text}
+"""
+
+    def generation_config(self) -> Dict[str, Any]:
+        return {
+            "response_mime_type": "application/json",
+            "response_json_schema": self.response_schema(),
+            # Generous for the node cap; bounds the cost of a runaway answer
+            "max_output_tokens": settings.MINDMAP_MAX_NODES * 40 + 200,
+            # On 2.5 models thinking tokens count against max_output_tokens and can leave no room for
+            # the JSON; the schema already fixes the structure, so skip thinking
+            "thinking_config": {"thinking_budget": 0},
+        }
+
+    def parse_stream(self, pieces) -> Any:
+        """Parses streamed output, stopping early once far more nodes than the cap have arrived."""
+        parser = IncrementalJSONParser()
+        try:
+            for piece in pieces:
+                parser.feed(piece)
+                if parser.objects > settings.MINDMAP_MAX_NODES * 2:
+                    break
+        finally:
+            close = getattr(pieces, "close", None)
+            if close:
+                close()
+        return parser.result()
+
+    def normalize(self, tree: Any, fallback_title: Optional[str] = None) -> Dict[str, Any]:
+        """Validates a parsed tree and trims it breadth-first to the node, depth and fan-out limits.
+
+        Breadth-first trimming keeps every top-level branch before any deep detail.
+        """
+        if isinstance(tree, list) and len(tree) == 1:
+            tree = tree[0]
+        if not isinstance(tree, dict):
+            raise MindmapParseError("Mindmap root is not an object")
+
+        def label(node) -> Optional[str]:
+            if isinstance(node, dict) and isinstance(node.get("name"), (str, int, float)):
+                name = " ".join(str(node["name"]).split())
+                return name[:120] or None
+            return None
+
+        root_name = label(tree) or fallback_title
+        if not root_name:
+            raise MindmapParseError("Mindmap root has no name")
+        root = {"name": root_name, "children": []}
+        kept = 1
+        pending = deque([(tree, root, 1)])
+        while pending:
+            source, target, depth = pending.popleft()
+            if depth >= settings.MINDMAP_MAX_DEPTH:
+                continue
+            children = source.get("children") if isinstance(source.get("children"), list) else []
+            for child in children[:settings.MINDMAP_MAX_CHILDREN]:
+                name = label(child)
+                if name is None:
+                    continue
+                if kept >= settings.MINDMAP_MAX_NODES:
+                    return root
+                node = {"name": name, "children": []}
+                target["children"].append(node)
+                kept += 1
+                pending.append((child, node, depth + 1))
+        return root
+
+mindmap_service = MindmapService()
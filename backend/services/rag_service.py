@@ -1,21 +1,121 @@
+import contextvars
+import json
 import os
-import chromadb
-from google import genai
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from core.config import settings
+from core.metrics import metrics
+from services.context_service import context_service
+from services.rerank_service import rerank_service
+from services.tenant_service import tenant_service, QuotaExceeded
+
+class NoRelevantContext(Exception):
+    """Raised when retrieval finds no chunks to answer from."""
+
+class _CollectionHandle:
+    """A Chroma collection opened by name that follows the name if the collection is replaced.
+
+    Another worker's GC may drop an empty tenant collection or swap in a compacted
+    copy; calls through the old handle then raise NotFoundError. The handle
+    reopens the collection by name and retries the call once.
+    """
+    def __init__(self, client, name: str):
+        self._client = client
+        self._name = name
+        self._collection = client.get_or_create_collection(name=name)
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            from chromadb.errors import NotFoundError
+            try:
+                return getattr(self._collection, attr)(*args, **kwargs)
+            except NotFoundError:
+                self._collection = self._client.get_or_create_collection(name=self._name)
+                return getattr(self._collection, attr)(*args, **kwargs)
+        return call
 
 class RAGService:
     def __init__(self):
-        # Initialize GenAI Client
-        # The key should be passed either via env GEMINI_API_KEY
-        # If not, it will fail gracefully during generation if not set
-        self.client = None
-        if settings.GEMINI_API_KEY:
-             self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        
-        # Initialize ChromaDB client
-        os.makedirs(settings.CHROMA_DB_PATH, exist_ok=True)
-        self.chroma_client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
-        self.collection = self.chroma_client.get_or_create_collection(name="research_papers")
+        # Clients are built on first use (or by the start-up warm-up) so importing
+        # this module stays cheap and does not touch disk or the network
+        self._client = None
+        self.chroma_client = None
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """GenAI client, or None when GEMINI_API_KEY is not set (generation then fails gracefully)."""
+        if self._client is None and settings.GEMINI_API_KEY:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=settings.GEMINI_API_KEY)
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    def _chroma(self):
+        if self.chroma_client is None:
+            import chromadb
+            if settings.CHROMA_HOST:
+                # A Chroma server is safe to share between API worker processes
+                self.chroma_client = chromadb.HttpClient(host=settings.CHROMA_HOST, port=settings.CHROMA_PORT)
+            else:
+                os.makedirs(settings.CHROMA_DB_PATH, exist_ok=True)
+                self.chroma_client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
+        return self.chroma_client
+
+    def collection_for(self, tenant_id: str):
+        """Chroma collection holding one tenant's chunks, opened on first use."""
+        return self.open_collection(tenant_service.collection_name(tenant_id))
+
+    def open_collection(self, name: str):
+        if name not in self._collections:
+            with self._lock:
+                if name not in self._collections:
+                    self._collections[name] = _CollectionHandle(self._chroma(), name)
+        return self._collections[name]
+
+    def collection_names(self) -> list[str]:
+        """Names of every tenant's chunk collection in the Chroma store."""
+        names = [getattr(c, "name", c) for c in self._chroma().list_collections()]
+        return sorted(n for n in names if n == tenant_service.collection_name(settings.DEFAULT_TENANT)
+                      or n.startswith(tenant_service.collection_name(settings.DEFAULT_TENANT) + "__"))
+
+    def drop_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            self._chroma().delete_collection(name)
+
+    def replace_collection(self, name: str, replacement_name: str) -> str:
+        """Renames the replacement collection to name; returns the new name of the collection it replaced.
+
+        Workers holding the old handle keep writing to the replaced collection
+        until the caller drops it, so the caller carries those writes over first.
+        """
+        retired_name = f"retired.{name}"
+        with self._lock:
+            replacement = self._collections.pop(replacement_name, None) or self._chroma().get_collection(replacement_name)
+            self._chroma().get_collection(name).modify(name=retired_name)
+            replacement.modify(name=name)
+            self._collections[name] = _CollectionHandle(self._chroma(), name)
+        return retired_name
+
+    @property
+    def collection(self):
+        """Current tenant's Chroma collection; queries never scan other tenants' chunks."""
+        return self.collection_for(tenant_service.current())
+
+    @collection.setter
+    def collection(self, value):
+        self._collections[tenant_service.collection_name(settings.DEFAULT_TENANT)] = value
 
     def _chunk_text(self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[str]:
         """Simple token-efficient sliding window chunking."""
@@ -45,13 +145,32 @@ class RAGService:
                 
         return chunks
 
-    def process_and_store_document(self, text: str, document_id: str, metadata: dict):
-        """Chunks text, creates embeddings, and stores in Chroma."""
+    def _chunk_sections(self, text: str, sections: list[dict]) -> list[tuple[str, dict]]:
+        """Chunks each section separately so no chunk straddles a section boundary."""
+        if not sections:
+            return [(chunk, {}) for chunk in self._chunk_text(text)]
+        chunks, pending = [], None
+        for i, section in enumerate(sections):
+            start = pending["start"] if pending else section["start"]
+            section_text = text[start:section["end"]]
+            # Fold very short sections (titles, author blocks) into the next one
+            if len(section_text) < 500 and i < len(sections) - 1:
+                pending = pending or section
+                continue
+            owner = pending or section
+            pending = None
+            for chunk in self._chunk_text(section_text):
+                chunks.append((chunk, {"section": owner["title"], "page": owner["page"]}))
+        return chunks
+
+    def process_and_store_document(self, text: str, document_id: str, metadata: dict, sections: list[dict] = None):
+        """Chunks text (per section when a section map is given), creates embeddings, and stores in Chroma."""
         if not self.client:
             print("Warning: Gemini API Key not set. Cannot store document embeddings.")
             return False
 
-        chunks = self._chunk_text(text)
+        with metrics.span("chunking"):
+            chunks = self._chunk_sections(text, sections)
         
         # Note: We can rely on ChromaDB's default embedding function, 
         # or we can explicitly use Gemini embeddings. 
@@ -59,56 +178,100 @@ class RAGService:
         
         try:
             # Create embeddings in batches (simplification: one-by-one here, could be batched)
-            for i, chunk in enumerate(chunks):
+            for i, (chunk, chunk_metadata) in enumerate(chunks):
                 if not chunk: continue
                 
-                # We use the new google-genai SDK 
-                response = self.client.models.embed_content(
-                    model='gemini-embedding-001',
-                    contents=chunk,
-                )
-                embedding = response.embeddings[0].values
+                embedding = self._embed(chunk)
                 
-                self.collection.add(
-                    documents=[chunk],
-                    embeddings=[embedding],
-                    metadatas=[{**metadata, "chunk_index": i}],
-                    ids=[f"{document_id}_chunk_{i}"]
-                )
+                with metrics.span("chroma_add"):
+                    self.collection.add(
+                        documents=[chunk],
+                        embeddings=[embedding],
+                        metadatas=[{**metadata, **chunk_metadata, "chunk_index": i}],
+                        ids=[f"{document_id}_chunk_{i}"]
+                    )
             return True
         except Exception as e:
             print(f"Error processing document to Vector DB: {e}")
             return False
 
-    def query_document(self, query: str, document_id: str = None, top_k: int = 5) -> str:
-        """Retrieves top-k relevant chunks and queries Gemini."""
-        if not self.client:
-            return "Error: Gemini API key not configured."
-            
-        try:
-            # 1. Embed query
+    def _embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Embeds several texts in one request."""
+        with metrics.span("embedding"):
             response = self.client.models.embed_content(
                 model='gemini-embedding-001',
-                contents=query,
+                contents=texts,
             )
-            query_embedding = response.embeddings[0].values
-            
-            # 2. Retrieve chunks
-            filter_dict = {"document_id": document_id} if document_id else None
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=filter_dict
+        return [embedding.values for embedding in response.embeddings]
+
+    def _embed(self, text: str) -> list[float]:
+        """Embeds one text with the new google-genai SDK."""
+        with metrics.span("embedding"):
+            response = self.client.models.embed_content(
+                model='gemini-embedding-001',
+                contents=text,
             )
-            
-            if not results['documents'] or not results['documents'][0]:
-                return "No relevant context found in the document to answer your query."
-                
-            retrieved_chunks = results['documents'][0]
-            context = "\n\n---\n\n".join(retrieved_chunks)
-            
-            # 3. Augment prompt
-            prompt = f"""
+        return response.embeddings[0].values
+
+    def generate(self, prompt: str, endpoint: str, config: dict = None) -> str:
+        """Sends a prompt to Gemini, recording its size and token usage against the endpoint."""
+        prompt_tokens = context_service.record_prompt(endpoint, prompt)
+        try:
+            # Only real Gemini calls count against the tenant's LLM quota; cached artifacts never get here
+            with tenant_service.quota("llm"), metrics.span("llm_generation"):
+                response = self.client.models.generate_content(
+                    model='gemini-2.5-flash',
+                    contents=prompt,
+                    config=config
+                )
+        except Exception as e:
+            error_str = str(e)
+            if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
+                metrics.llm_rate_limited.inc(endpoint=endpoint)
+            raise
+
+        # Prefer the usage Gemini reports; fall back to local estimates
+        usage = getattr(response, "usage_metadata", None)
+        tokens_in = getattr(usage, "prompt_token_count", None) or prompt_tokens
+        tokens_out = getattr(usage, "candidates_token_count", None) or context_service.count_tokens(response.text)
+        metrics.llm_tokens.inc(tokens_in, endpoint=endpoint, direction="in")
+        metrics.llm_tokens.inc(tokens_out, endpoint=endpoint, direction="out")
+        return response.text
+
+    def generate_stream(self, prompt: str, endpoint: str, config: dict = None):
+        """Streams a Gemini generation as text pieces, with the same accounting as generate().
+
+        Closing the generator early stops reading the stream, so callers can
+        abandon an answer once they have what they need.
+        """
+        prompt_tokens = context_service.record_prompt(endpoint, prompt)
+        usage, pieces = None, []
+        try:
+            with tenant_service.quota("llm"), metrics.span("llm_generation"):
+                stream = self.client.models.generate_content_stream(
+                    model='gemini-2.5-flash',
+                    contents=prompt,
+                    config=config
+                )
+                for chunk in stream:
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if chunk.text:
+                        pieces.append(chunk.text)
+                        yield chunk.text
+        except Exception as e:
+            error_str = str(e)
+            if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
+                metrics.llm_rate_limited.inc(endpoint=endpoint)
+            raise
+        finally:
+            tokens_in = getattr(usage, "prompt_token_count", None) or prompt_tokens
+            tokens_out = getattr(usage, "candidates_token_count", None) or context_service.count_tokens("".join(pieces))
+            metrics.llm_tokens.inc(tokens_in, endpoint=endpoint, direction="in")
+            metrics.llm_tokens.inc(tokens_out, endpoint=endpoint, direction="out")
+
+    def _answer_prompt(self, query: str, chunks: list[str]) -> str:
+        context = "\n\n---\n\n".join(chunks)
+        return f"""
             You are ResearchPilot AI, an expert research assistant.
             Use only the following context chunks retrieved from the paper to answer the user's query.
             If the context does not contain the answer, say "I cannot find the answer in the provided document context."
@@ -120,19 +283,217 @@ class RAGService:
             
             Answer:
             """
-            
-            # 4. Generate answer
-            gen_response = self.client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=prompt,
+
+    def _error_answer(self, e: Exception) -> str:
+        if isinstance(e, QuotaExceeded):
+            return f"⚠️ **Too many requests for this workspace:** please try again in {e.retry_after} seconds."
+        error_str = str(e)
+        if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
+            return "⚠️ **Gemini API Rate Limit Exceeded:** You are using the Free Tier of Gemini, which allows around 15 requests per minute. Please wait 30 seconds and try again."
+        return f"Error during query generation: {error_str}"
+
+    def answer(self, query: str, document_id: str = None, top_k: int = 5, endpoint: str = "query") -> str:
+        """Retrieves top-k relevant chunks and queries Gemini within the endpoint's token budget.
+
+        Raises NoRelevantContext when retrieval finds nothing, and passes other
+        failures through, so callers that cache the result never store an error.
+        """
+        if not self.client:
+            raise RuntimeError("Gemini API key not configured.")
+
+        # 1. Embed query
+        query_embedding = self._embed(query)
+
+        # 2. Retrieve chunks: over-fetch, then keep the reranker's best few
+        filter_dict = {"document_id": document_id} if document_id else None
+        with metrics.span("chroma_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=rerank_service.candidates_for(top_k),
+                where=filter_dict
             )
-            
-            return gen_response.text
-            
+
+        if not results['documents'] or not results['documents'][0]:
+            raise NoRelevantContext("No relevant context found in the document to answer your query.")
+
+        distances = (results.get('distances') or [None])[0]
+        retrieved_chunks = rerank_service.rerank(
+            query, results['documents'][0], distances, top_k, context_service.budget_for(endpoint), endpoint
+        )
+
+        # 3. Augment prompt and 4. generate answer
+        return self.generate(self._answer_prompt(query, retrieved_chunks), endpoint)
+
+    def query_document(self, query: str, document_id: str = None, top_k: int = 5, endpoint: str = "query") -> str:
+        """Like answer(), but failures come back as text to show the user (quota errors still raise)."""
+        if not self.client:
+            return "Error: Gemini API key not configured."
+        try:
+            return self.answer(query, document_id, top_k, endpoint)
+        except NoRelevantContext as e:
+            return str(e)
+        except QuotaExceeded:
+            raise
         except Exception as e:
-            error_str = str(e)
-            if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
-                return "⚠️ **Gemini API Rate Limit Exceeded:** You are using the Free Tier of Gemini, which allows around 15 requests per minute. Please wait 30 seconds and try again."
-            return f"Error during query generation: {error_str}"
+            return self._error_answer(e)
+
+    def _group_queries(self, retrieved: list[list[str]], budget: int) -> list[dict]:
+        """Groups queries so that each group's deduplicated context fits one prompt.
+
+        A query joins the open group it shares the most chunks with, as long as the
+        group's context stays within budget and under QUERY_BATCH_GROUP_SIZE queries.
+        Queries that retrieved nothing are left out; they need no prompt.
+        """
+        groups = []
+        for index, chunks in enumerate(retrieved):
+            if not chunks:
+                continue
+            best, best_shared = None, -1
+            for group in groups:
+                if len(group["indexes"]) >= settings.QUERY_BATCH_GROUP_SIZE:
+                    continue
+                new_chunks = [c for c in chunks if c not in group["seen"]]
+                extra = sum(context_service.count_tokens(c) for c in new_chunks)
+                shared = len(chunks) - len(new_chunks)
+                if group["tokens"] + extra <= budget and shared > best_shared:
+                    best, best_shared = group, shared
+            if best is None:
+                best = {"indexes": [], "chunks": [], "seen": set(), "tokens": 0}
+                groups.append(best)
+            best["indexes"].append(index)
+            for chunk in chunks:
+                if chunk not in best["seen"]:
+                    best["seen"].add(chunk)
+                    best["chunks"].append(chunk)
+                    best["tokens"] += context_service.count_tokens(chunk)
+        return groups
+
+    def _answer_group(self, queries: list[str], group: dict, endpoint: str) -> dict:
+        """Answers one group of queries; returns {query index: answer}.
+
+        Every generation takes one of the tenant's LLM slots, waiting up to
+        QUOTA_WAIT_SECONDS for it, so concurrent batches share the tenant's limit.
+        """
+        with tenant_service.waiting_for_quota(settings.QUOTA_WAIT_SECONDS):
+            return self._answer_group_prompts(queries, group, endpoint)
+
+    def _answer_group_prompts(self, queries: list[str], group: dict, endpoint: str) -> dict:
+        indexes = group["indexes"]
+        if len(indexes) == 1:
+            try:
+                return {indexes[0]: self.generate(self._answer_prompt(queries[indexes[0]], group["chunks"]), endpoint)}
+            except Exception as e:
+                return {indexes[0]: self._error_answer(e)}
+
+        context = "\n\n---\n\n".join(group["chunks"])
+        questions = "\n".join(f"{n}. {queries[i]}" for n, i in enumerate(indexes, start=1))
+        prompt = f"""
+You are ResearchPilot AI, an expert research assistant.
+Use only the following context chunks retrieved from the paper to answer each of the user's questions.
+If the context does not contain the answer to a question, answer "I cannot find the answer in the provided document context."
+Return a JSON object with an "answers" array holding one {{"number", "answer"}} entry per question.
+
+Context:
+{context}
+
+Questions:
+{questions}
+"""
+        config = {
+            "response_mime_type": "application/json",
+            "response_json_schema": {
+                "type": "object",
+                "properties": {"answers": {"type": "array", "items": {
+                    "type": "object",
+                    "properties": {"number": {"type": "integer"}, "answer": {"type": "string"}},
+                    "required": ["number", "answer"]
+                }}},
+                "required": ["answers"]
+            }
+        }
+        answers = {}
+        try:
+            parsed = json.loads(self.generate(prompt, endpoint, config=config))
+            for item in parsed.get("answers", []):
+                number = int(item["number"])
+                if 1 <= number <= len(indexes):
+                    answers[indexes[number - 1]] = str(item["answer"])
+        except QuotaExceeded as e:
+            # Asking each question separately would only need more slots
+            return {i: self._error_answer(e) for i in indexes}
+        except Exception as e:
+            print(f"Batched answer generation failed, answering individually: {e}")
+        # Anything the combined answer missed is asked on its own
+        for i in indexes:
+            if i not in answers:
+                try:
+                    answers[i] = self.generate(self._answer_prompt(queries[i], group["chunks"]), endpoint)
+                except Exception as e:
+                    answers[i] = self._error_answer(e)
+        return answers
+
+    def query_batch(self, queries: list[str], document_id: str = None, top_k: int = 5, endpoint: str = "query_batch"):
+        """Answers many queries about one paper, yielding {"index", "query", "answer"} as groups finish.
+
+        All queries are embedded in one request and retrieved with one multi-vector
+        Chroma query. Queries whose chunks overlap share one prompt in which each
+        chunk appears once, and the prompts run concurrently. A final {"stats": ...}
+        item reports how much context the batching saved.
+        """
+        if not self.client:
+            for index, query in enumerate(queries):
+                yield {"index": index, "query": query, "answer": "Error: Gemini API key not configured."}
+            return
+
+        try:
+            embeddings = self._embed_many(queries)
+            filter_dict = {"document_id": document_id} if document_id else None
+            with metrics.span("chroma_query"):
+                results = self.collection.query(
+                    query_embeddings=embeddings,
+                    n_results=rerank_service.candidates_for(top_k),
+                    where=filter_dict
+                )
+        except Exception as e:
+            for index, query in enumerate(queries):
+                yield {"index": index, "query": query, "answer": self._error_answer(e)}
+            return
+
+        per_query_budget = context_service.budget_for("query")
+        all_distances = results.get("distances") or [None] * len(queries)
+        retrieved = [
+            rerank_service.rerank(query, chunks or [], distances, top_k, per_query_budget, endpoint)
+            for query, chunks, distances in zip(queries, results["documents"], all_distances)
+        ]
+        groups = self._group_queries(retrieved, context_service.budget_for(endpoint))
+
+        unbatched_tokens = sum(context_service.count_tokens(c) for chunks in retrieved for c in chunks)
+        batched_tokens = sum(group["tokens"] for group in groups)
+        metrics.batch_context_tokens_saved.inc(unbatched_tokens - batched_tokens)
+
+        no_context = "No relevant context found in the document to answer your query."
+        workers = ThreadPoolExecutor(max_workers=settings.QUERY_BATCH_CONCURRENCY)
+        try:
+            # Each task runs in a copy of this context so tenant and request spans carry over
+            pending = [
+                workers.submit(contextvars.copy_context().run, self._answer_group, queries, group, endpoint)
+                for group in groups
+            ]
+            for i, chunks in enumerate(retrieved):
+                if not chunks:
+                    yield {"index": i, "query": queries[i], "answer": no_context}
+            for future in as_completed(pending):
+                for i, answer in sorted(future.result().items()):
+                    yield {"index": i, "query": queries[i], "answer": answer}
+        finally:
+            workers.shutdown(wait=False, cancel_futures=True)
+
+        yield {"stats": {
+            "queries": len(queries),
+            "prompts": len(pending),
+            "unique_chunks": len({c for chunks in retrieved for c in chunks}),
+            "context_tokens": batched_tokens,
+            "context_tokens_unbatched": unbatched_tokens
+        }}
 
-rag_service = RAGService()
+rag_service = RAGService()
\ No newline at end of file
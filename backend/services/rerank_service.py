@@ -0,0 +1,144 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.context_service import context_service
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by does for from how in is it of on or paper that the this to was what which with".split()
+)
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+def _normalize(values: List[float]) -> List[float]:
+    low, high = min(values), max(values)
+    if high - low < 1e-12:
+        return [1.0] * len(values)
+    return [(v - low) / (high - low) for v in values]
+
+class RerankService:
+    """Second retrieval stage: rescores over-fetched Chroma candidates with a local scorer.
+
+    Scorers take (query, chunks, similarities) and return one score per chunk,
+    higher is better. Built in:
+
+    - "bm25": a linear model over BM25 term overlap and the vector similarity
+      Chroma already computed, weighted by RERANK_WEIGHTS; pure Python, no model.
+    - "cross_encoder": a sentence-transformers CrossEncoder run on CPU in batches.
+      Needs the optional sentence-transformers package; falls back to "bm25".
+    - "none": keeps Chroma's order (single-stage retrieval).
+    """
+
+    def __init__(self):
+        self._scorers: Dict[str, Callable[[str, List[str], List[float]], List[float]]] = {
+            "bm25": self._score_linear,
+            "cross_encoder": self._score_cross_encoder,
+        }
+        self._cross_encoder = None
+        self._cross_encoder_failed = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, scorer: Callable[[str, List[str], List[float]], List[float]]):
+        self._scorers[name] = scorer
+
+    @property
+    def enabled(self) -> bool:
+        return settings.RERANK_SCORER in self._scorers
+
+    def candidates_for(self, top_k: int) -> int:
+        """How many chunks to fetch from Chroma for a request that wants top_k."""
+        return max(top_k, settings.RERANK_CANDIDATES) if self.enabled else top_k
+
+    def _bm25(self, query: str, chunks: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+        # Document frequencies come from the candidate set itself, which is all we have locally
+        docs = [Counter(_terms(chunk)) for chunk in chunks]
+        avg_len = (sum(sum(d.values()) for d in docs) / len(docs)) or 1.0
+        query_terms = set(_terms(query))
+        scores = []
+        for doc in docs:
+            length = sum(doc.values())
+            score = 0.0
+            for term in query_terms:
+                tf = doc.get(term, 0)
+                if not tf:
+                    continue
+                df = sum(1 for d in docs if term in d)
+                idf = math.log((len(docs) - df + 0.5) / (df + 0.5) + 1)
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+            scores.append(score)
+        return scores
+
+    def _score_linear(self, query: str, chunks: List[str], similarities: List[float]) -> List[float]:
+        weights = settings.RERANK_WEIGHTS
+        lexical = _normalize(self._bm25(query, chunks))
+        vector = _normalize(similarities)
+        return [weights.get("bm25", 0) * l + weights.get("vector", 0) * v for l, v in zip(lexical, vector)]
+
+    def _score_cross_encoder(self, query: str, chunks: List[str], similarities: List[float]) -> List[float]:
+        if self._cross_encoder is None and not self._cross_encoder_failed:
+            with self._lock:
+                if self._cross_encoder is None and not self._cross_encoder_failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        self._cross_encoder = CrossEncoder(settings.RERANK_CROSS_ENCODER_MODEL, device="cpu")
+                    except Exception as e:
+                        print(f"Cross-encoder unavailable, reranking with bm25 instead: {e}")
+                        self._cross_encoder_failed = True
+        if self._cross_encoder is None:
+            return self._score_linear(query, chunks, similarities)
+        scores = self._cross_encoder.predict([(query, chunk) for chunk in chunks], batch_size=32)
+        return [float(s) for s in scores]
+
+    def rerank(self, query: str, chunks: List[str], distances: Optional[List[float]], top_k: int,
+               budget: int, endpoint: str) -> List[str]:
+        """Returns the context chunks to send for a query, packed into the endpoint budget.
+
+        Without reranking this is Chroma's first top_k chunks. With it, all
+        candidates are rescored and only the best min(top_k, RERANK_KEEP) are
+        kept. Either way one JSON line per query reports the latency and the
+        prompt tokens saved against the plain top_k context.
+        """
+        chunks = [c for c in chunks if c and c.strip()]
+        baseline = context_service.pack_chunks(chunks[:top_k], budget)
+        if not self.enabled or len(chunks) <= 1:
+            return baseline
+
+        if distances and len(distances) == len(chunks):
+            similarities = [-d for d in distances]
+        else:
+            # No distances (e.g. a stub collection): fall back to rank order
+            similarities = [-float(i) for i in range(len(chunks))]
+
+        start = time.perf_counter()
+        with metrics.span("rerank"):
+            scores = self._scorers[settings.RERANK_SCORER](query, chunks, similarities)
+        elapsed = time.perf_counter() - start
+
+        ranked = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        keep = min(top_k, settings.RERANK_KEEP)
+        kept = context_service.pack_chunks([chunks[i] for i in ranked[:keep]], budget)
+
+        baseline_tokens = sum(context_service.count_tokens(c) for c in baseline)
+        kept_tokens = sum(context_service.count_tokens(c) for c in kept)
+        metrics.rerank_tokens_saved.inc(max(0, baseline_tokens - kept_tokens), endpoint=endpoint)
+        print(json.dumps({
+            "event": "rerank",
+            "endpoint": endpoint,
+            "scorer": settings.RERANK_SCORER,
+            "candidates": len(chunks),
+            "kept": len(kept),
+            "rerank_ms": round(elapsed * 1000, 2),
+            "context_tokens": kept_tokens,
+            "context_tokens_top_k": baseline_tokens
+        }))
+        return kept
+
+rerank_service = RerankService()
@@ -1,8 +1,16 @@
 import requests
 import json
 import os
+import time
 from typing import List, Dict, Any
 from core.config import settings
+from core.metrics import metrics
+from services.coordination_service import coordination_service
+from services.tenant_service import tenant_service
+
+_HEADERS = {
+    "User-Agent": "ResearchPilotAI/1.0 (https://github.com/yourusername/researchpilot)"
+}
 
 class SearchService:
     def __init__(self):
@@ -21,15 +29,89 @@ class SearchService:
             return json.load(f)
 
     def _write_db(self, data: Dict[str, List[Any]]):
-        with open(self.db_path, "w") as f:
+        # Write to a temp file and swap it in so readers never see a half-written file
+        tmp_path = f"{self.db_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
             json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.db_path)
 
-    def search_wikipedia(self, query: str, user_id: str = "default_user") -> List[Dict[str, Any]]:
-        """Search Wikipedia and log the query."""
-        # Log the search
-        self.record_search(user_id, query)
+    def _append_event(self, kind: str, event: Dict[str, Any]):
+        """Read-modify-write of the history file under a cross-worker lock so no event is lost."""
+        event["tenant_id"] = tenant_service.current()
+        with coordination_service.file_lock(self.db_path):
+            db = self._read_db()
+            db[kind].append(event)
+            self._write_db(db)
+
+    def export_history(self) -> Dict[str, List[Any]]:
+        return self._read_db()
+
+    def import_history(self, data: Dict[str, List[Any]]) -> int:
+        """Merges events from another install's history, skipping ones already present; returns the number added."""
+        added = 0
+        with coordination_service.file_lock(self.db_path):
+            db = self._read_db()
+            for kind in ("searches", "interactions", "rollups"):
+                existing = {json.dumps(e, sort_keys=True) for e in db.get(kind, [])}
+                for event in data.get(kind, []):
+                    if json.dumps(event, sort_keys=True) not in existing:
+                        db.setdefault(kind, []).append(event)
+                        added += 1
+            self._write_db(db)
+        return added
+
+    def rollup_history(self, retention_days: int = None, max_events: int = None) -> Dict[str, int]:
+        """Folds old events into per-user daily counts so the history file stops growing.
+
+        Events older than retention_days, and beyond the newest max_events of
+        each kind, become one rollup per (kind, day, tenant, user) with the
+        event count and its most frequent queries or titles. The feed only reads
+        recent events, so it is unaffected.
+        """
+        retention_days = settings.SEARCH_EVENT_RETENTION_DAYS if retention_days is None else retention_days
+        max_events = settings.SEARCH_EVENTS_MAX if max_events is None else max_events
+        cutoff = time.time() - retention_days * 86400
+        rolled = 0
+        with coordination_service.file_lock(self.db_path):
+            size_before = os.path.getsize(self.db_path)
+            db = self._read_db()
+            rollups = {(r["kind"], r["day"], r["tenant_id"], r["user_id"]): r for r in db.get("rollups", [])}
+            for kind, label in (("searches", "query"), ("interactions", "title")):
+                events = sorted(db.get(kind, []), key=lambda e: e.get("timestamp", 0))
+                overflow = max(0, len(events) - max_events)
+                kept = []
+                for i, event in enumerate(events):
+                    if i >= overflow and event.get("timestamp", 0) >= cutoff:
+                        kept.append(event)
+                        continue
+                    day = time.strftime("%Y-%m-%d", time.gmtime(event.get("timestamp", 0)))
+                    tenant_id = event.get("tenant_id", settings.DEFAULT_TENANT)
+                    rollup = rollups.setdefault((kind, day, tenant_id, event.get("user_id")), {
+                        "kind": kind, "day": day, "tenant_id": tenant_id, "user_id": event.get("user_id"),
+                        "count": 0, "top": {}
+                    })
+                    rollup["count"] += 1
+                    if event.get(label):
+                        rollup["top"][event[label]] = rollup["top"].get(event[label], 0) + 1
+                    rolled += 1
+                db[kind] = kept
+            if rolled:
+                for rollup in rollups.values():
+                    rollup["top"] = dict(sorted(rollup["top"].items(), key=lambda item: -item[1])[:10])
+                db["rollups"] = sorted(rollups.values(), key=lambda r: (r["day"], r["kind"]))
+                self._write_db(db)
+            size_after = os.path.getsize(self.db_path)
+        return {"events_rolled_up": rolled, "reclaimed_bytes": max(0, size_before - size_after)}
+
+    def _search(self, query: str) -> List[Dict[str, Any]]:
+        """Runs a Wikipedia full-text search, sharing recent results across workers."""
+        # Tenant-scoped so one tenant cannot tell from response times what another searched for
+        cache_key = tenant_service.cache_key(f"wiki_search:{query}")
+        cached = coordination_service.cache_get(cache_key)
+        metrics.cache_hit("wikipedia_search", cached is not None)
+        if cached is not None:
+            return cached
 
-        # Perform the search against Wikipedia API
         params = {
             "action": "query",
             "list": "search",
@@ -37,31 +119,41 @@ class SearchService:
             "format": "json",
             "utf8": 1
         }
-        
-        headers = {
-            "User-Agent": "ResearchPilotAI/1.0 (https://github.com/yourusername/researchpilot)"
-        }
-        
+        with metrics.span("wikipedia_fetch"):
+            response = requests.get(self.wikipedia_api_url, params=params, headers=_HEADERS)
+        response.raise_for_status()
+        data = response.json()
+
+        results = []
+        for item in data.get("query", {}).get("search", []):
+            results.append({
+                "title": item["title"],
+                "snippet": item["snippet"],
+                "pageid": item["pageid"],
+                "url": f"https://en.wikipedia.org/?curid={item['pageid']}"
+            })
+        coordination_service.cache_set(cache_key, results, settings.WIKIPEDIA_CACHE_SECONDS)
+        return results
+
+    def search_wikipedia(self, query: str, user_id: str = "default_user") -> List[Dict[str, Any]]:
+        """Search Wikipedia and log the query."""
+        # Log the search
+        self.record_search(user_id, query)
+
         try:
-            response = requests.get(self.wikipedia_api_url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for item in data.get("query", {}).get("search", []):
-                results.append({
-                    "title": item["title"],
-                    "snippet": item["snippet"],
-                    "pageid": item["pageid"],
-                    "url": f"https://en.wikipedia.org/?curid={item['pageid']}"
-                })
-            return results
+            return self._search(query)
         except requests.RequestException as e:
             print(f"Wikipedia API error: {e}")
             return []
 
     def get_wikipedia_text(self, pageid: str) -> str:
         """Fetch the full plain text extract of a Wikipedia article."""
+        cache_key = tenant_service.cache_key(f"wiki_extract:{pageid}")
+        cached = coordination_service.cache_get(cache_key)
+        metrics.cache_hit("wikipedia_extract", cached is not None)
+        if cached is not None:
+            return cached
+
         params = {
             "action": "query",
             "prop": "extracts",
@@ -70,49 +162,48 @@ class SearchService:
             "format": "json",
             "utf8": 1
         }
-        headers = {
-            "User-Agent": "ResearchPilotAI/1.0 (https://github.com/yourusername/researchpilot)"
-        }
         try:
-            response = requests.get(self.wikipedia_api_url, params=params, headers=headers)
+            with metrics.span("wikipedia_fetch"):
+                response = requests.get(self.wikipedia_api_url, params=params, headers=_HEADERS)
             response.raise_for_status()
             data = response.json()
             pages = data.get("query", {}).get("pages", {})
-            return pages.get(str(pageid), {}).get("extract", "")
+            extract = pages.get(str(pageid), {}).get("extract", "")
+            if extract:
+                coordination_service.cache_set(cache_key, extract, settings.WIKIPEDIA_CACHE_SECONDS)
+            return extract
         except requests.RequestException as e:
             print(f"Wikipedia API error fetching extract: {e}")
             return ""
 
     def record_search(self, user_id: str, query: str):
         """Log a search query for personalization."""
-        import time
-        db = self._read_db()
-        db["searches"].append({
+        self._append_event("searches", {
             "user_id": user_id,
             "query": query,
             "timestamp": time.time()
         })
-        self._write_db(db)
 
     def record_interaction(self, user_id: str, pageid: str, title: str):
         """Log when a user clicks a specific search result."""
-        import time
-        db = self._read_db()
-        db["interactions"].append({
+        self._append_event("interactions", {
             "user_id": user_id,
             "pageid": pageid,
             "title": title,
             "timestamp": time.time()
         })
-        self._write_db(db)
 
     def get_feed(self, user_id: str = "default_user") -> List[Dict[str, Any]]:
         """Generate a personalized feed based on recent interactions and searches."""
         db = self._read_db()
         
-        # Get user's recent activity
-        user_searches = [s for s in db.get("searches", []) if s.get("user_id") == user_id]
-        user_interactions = [i for i in db.get("interactions", []) if i.get("user_id") == user_id]
+        # Get user's recent activity; user ids are only unique within a tenant
+        # and events logged before tenancy existed belong to the default tenant
+        tenant_id = tenant_service.current()
+        def is_own(event):
+            return event.get("user_id") == user_id and event.get("tenant_id", settings.DEFAULT_TENANT) == tenant_id
+        user_searches = [s for s in db.get("searches", []) if is_own(s)]
+        user_interactions = [i for i in db.get("interactions", []) if is_own(i)]
         
         # Sort by timestamp descending
         user_searches.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
@@ -142,35 +233,13 @@ class SearchService:
         
         # Execute the discovery search to build the feed
         # We don't want to log this discovery search in the user's explicit history
-        params = {
-            "action": "query",
-            "list": "search",
-            "srsearch": heuristic_query,
-            "format": "json",
-            "utf8": 1
-        }
-        
-        headers = {
-            "User-Agent": "ResearchPilotAI/1.0 (https://github.com/yourusername/researchpilot)"
-        }
-        
         try:
-            response = requests.get(self.wikipedia_api_url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
             feed_results = []
-            for item in data.get("query", {}).get("search", []):
+            for item in self._search(heuristic_query):
                 # Optionally filter out articles the user has already interacted with
                 if any(i.get("pageid") == str(item["pageid"]) for i in user_interactions):
                     continue
-                    
-                feed_results.append({
-                    "title": item["title"],
-                    "snippet": item["snippet"],
-                    "pageid": item["pageid"],
-                    "url": f"https://en.wikipedia.org/?curid={item['pageid']}"
-                })
+                feed_results.append(item)
                 
             return feed_results
         except requests.RequestException as e:
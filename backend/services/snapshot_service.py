@@ -0,0 +1,320 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List
+
+from core.config import settings
+from core.metrics import metrics
+from services.audio_service import audio_service
+from services.coordination_service import coordination_service
+from services.db_service import db_service
+from services.maintenance_service import MAINTENANCE_LOCK
+from services.rag_service import rag_service
+from services.search_service import search_service
+
+SNAPSHOT_FORMAT = "researchpilot-snapshot"
+SNAPSHOT_VERSION = 1
+_HASH_HEADER = "RESEARCHPILOT.sha256"
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is malformed, corrupt or incomplete."""
+
+class _QueueWriter:
+    """File-like sink that hands written bytes to a consumer thread.
+
+    Writes fail with SnapshotError once `cancelled` is set, so the producer
+    stops instead of blocking forever on a queue nobody reads.
+    """
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+
+    def put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise SnapshotError("Snapshot export cancelled")
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+class SnapshotService:
+    """Exports and restores the processed corpus without re-extracting or re-embedding anything.
+
+    A snapshot is an uncompressed tar stream of independently compressed parts,
+    so it can be written and read in one pass:
+
+    - snapshot.json: format header
+    - documents/part-NNNNN.jsonl.gz: Mongo records, all tenants
+    - chroma/<collection>/part-NNNNN.jsonl.gz + .npy: chunk ids, texts and
+      metadata, and their embeddings as a float32 matrix in numpy .npy format
+    - audio/<document_id>.mp3: podcast audio
+    - search/search_data.json.gz: search history
+    - manifest.json: every part with its sha256 and row count, written last
+
+    Each part's sha256 also travels in its tar header, so restore verifies
+    parts as they stream in, checks the manifest for missing or extra parts,
+    and only then applies them on a thread pool.
+    """
+
+    def _add(self, tar: tarfile.TarFile, name: str, data: bytes, parts: List[Dict[str, Any]], kind: str, rows: int = 1):
+        digest = hashlib.sha256(data).hexdigest()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.pax_headers = {_HASH_HEADER: digest}
+        tar.addfile(info, io.BytesIO(data))
+        parts.append({"path": name, "kind": kind, "sha256": digest, "bytes": len(data), "rows": rows})
+
+    def _jsonl_gz(self, rows: List[Any]) -> bytes:
+        body = "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+        return gzip.compress(body, compresslevel=6)
+
+    def export(self, fileobj: BinaryIO) -> Dict[str, Any]:
+        """Writes a snapshot of every tenant's data to a binary stream and returns its manifest."""
+        import numpy as np
+
+        started = time.perf_counter()
+        parts: List[Dict[str, Any]] = []
+        with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "created_at": time.time()}
+            self._add(tar, "snapshot.json", json.dumps(header).encode(), parts, "header")
+
+            # Mongo records, streamed from the cursor in fixed-size parts
+            batch, number = [], 0
+            for doc in db_service.docs_collection.find({}):
+                batch.append(doc)
+                if len(batch) >= settings.SNAPSHOT_DOCUMENTS_PER_PART:
+                    self._add(tar, f"documents/part-{number:05d}.jsonl.gz", self._jsonl_gz(batch), parts, "documents", len(batch))
+                    batch, number = [], number + 1
+            if batch:
+                self._add(tar, f"documents/part-{number:05d}.jsonl.gz", self._jsonl_gz(batch), parts, "documents", len(batch))
+
+            # Chroma chunks: metadata as gzipped JSON lines, vectors as raw float32 (they barely compress)
+            for name in rag_service.collection_names():
+                collection = rag_service.open_collection(name)
+                offset, number = 0, 0
+                while True:
+                    page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                          limit=settings.SNAPSHOT_VECTORS_PER_PART, offset=offset)
+                    if not page["ids"]:
+                        break
+                    rows = [{"id": i, "document": d, "metadata": m}
+                            for i, d, m in zip(page["ids"], page["documents"], page["metadatas"])]
+                    vectors = io.BytesIO()
+                    np.save(vectors, np.asarray(page["embeddings"], dtype=np.float32), allow_pickle=False)
+                    stem = f"chroma/{name}/part-{number:05d}"
+                    self._add(tar, f"{stem}.jsonl.gz", self._jsonl_gz(rows), parts, "chunks", len(rows))
+                    self._add(tar, f"{stem}.npy", vectors.getvalue(), parts, "vectors", len(rows))
+                    offset += len(page["ids"])
+                    number += 1
+
+            for filename in sorted(os.listdir(audio_service.audio_dir)):
+                if filename.endswith(".mp3"):
+                    with open(os.path.join(audio_service.audio_dir, filename), "rb") as f:
+                        self._add(tar, f"audio/{filename}", f.read(), parts, "audio")
+
+            history = search_service.export_history()
+            self._add(tar, "search/search_data.json.gz", gzip.compress(json.dumps(history).encode()), parts, "search",
+                      sum(len(v) for v in history.values()))
+
+            manifest = {**header, "parts": parts}
+            manifest_info = tarfile.TarInfo("manifest.json")
+            manifest_data = json.dumps(manifest, indent=2).encode()
+            manifest_info.size = len(manifest_data)
+            manifest_info.mtime = int(time.time())
+            tar.addfile(manifest_info, io.BytesIO(manifest_data))
+
+        metrics.stage_latency.observe(time.perf_counter() - started, stage="snapshot_export")
+        return manifest
+
+    def export_stream(self) -> Iterator[bytes]:
+        """Yields a snapshot as it is written, for streaming HTTP responses.
+
+        Closing the generator early (a client disconnect) stops the export thread.
+        """
+        chunks: "queue.Queue" = queue.Queue(maxsize=64)
+        cancelled = threading.Event()
+        writer = _QueueWriter(chunks, cancelled)
+        failure: List[BaseException] = []
+
+        def produce():
+            try:
+                self.export(writer)
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                try:
+                    writer.put(None)
+                except SnapshotError:
+                    pass
+
+        threading.Thread(target=produce, name="snapshot-export", daemon=True).start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            cancelled.set()
+        if failure:
+            raise failure[0]
+
+    # --- Restore ---
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _restore_documents(self, path: str) -> int:
+        from pymongo import ReplaceOne
+        docs = [json.loads(line) for line in gzip.decompress(self._read(path)).splitlines() if line.strip()]
+        if docs:
+            with metrics.span("mongo_write"):
+                db_service.docs_collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
+        return len(docs)
+
+    def _restore_vectors(self, collection_name: str, rows_path: str, vectors_path: str) -> int:
+        import numpy as np
+        rows = [json.loads(line) for line in gzip.decompress(self._read(rows_path)).splitlines() if line.strip()]
+        vectors = np.load(vectors_path, allow_pickle=False)
+        if len(rows) != len(vectors):
+            raise SnapshotError(f"{collection_name}: {len(rows)} chunks but {len(vectors)} vectors")
+        collection = rag_service.open_collection(collection_name)
+        step = settings.SNAPSHOT_CHROMA_BATCH
+        for start in range(0, len(rows), step):
+            batch = rows[start:start + step]
+            with metrics.span("chroma_add"):
+                collection.upsert(
+                    ids=[r["id"] for r in batch],
+                    documents=[r["document"] for r in batch],
+                    metadatas=[r["metadata"] for r in batch],
+                    embeddings=vectors[start:start + step]
+                )
+        return len(rows)
+
+    def _restore_audio(self, filename: str, staged_path: str) -> int:
+        path = os.path.join(audio_service.audio_dir, os.path.basename(filename))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(staged_path, tmp_path)
+        os.replace(tmp_path, path)
+        return 1
+
+    def _restore_search(self, path: str) -> int:
+        return search_service.import_history(json.loads(gzip.decompress(self._read(path))))
+
+    def restore(self, fileobj: BinaryIO) -> Dict[str, Any]:
+        """Reads a snapshot stream and applies its parts in parallel; returns restore counts.
+
+        Parts are verified and staged in a temporary directory first (it needs
+        room for the whole snapshot), and nothing is applied until the manifest
+        checks out, so a truncated or corrupt snapshot leaves the install
+        untouched. Records and chunks are upserted by id, so restoring into a
+        populated install (or restoring twice) overwrites rather than duplicates.
+        """
+        # Chunks can land before their records; storage GC would take them for orphans
+        with coordination_service.single_flight(MAINTENANCE_LOCK):
+            return self._restore(fileobj)
+
+    def _restore(self, fileobj: BinaryIO) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="rp_restore_") as staging:
+            try:
+                staged = self._stage(fileobj, staging)
+            except tarfile.TarError as e:
+                raise SnapshotError(f"Snapshot is truncated or not a tar stream: {e}")
+            counts = self._apply(staged)
+
+        elapsed = time.perf_counter() - started
+        metrics.stage_latency.observe(elapsed, stage="snapshot_restore")
+        return {**counts, "parts": len(staged), "seconds": round(elapsed, 2)}
+
+    def _stage(self, fileobj: BinaryIO, staging: str) -> Dict[str, str]:
+        """Verifies every part against its checksum and the manifest; returns {part name: staged path}."""
+        staged: Dict[str, str] = {}
+        seen: Dict[str, str] = {}
+        manifest = None
+        with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                data = tar.extractfile(member).read()
+                name = member.name
+
+                if name == "manifest.json":
+                    manifest = json.loads(data)
+                    continue
+                expected = member.pax_headers.get(_HASH_HEADER)
+                digest = hashlib.sha256(data).hexdigest()
+                if expected != digest:
+                    raise SnapshotError(f"Checksum mismatch for {name}")
+                seen[name] = digest
+
+                if name == "snapshot.json":
+                    header = json.loads(data)
+                    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+                        raise SnapshotError(f"Unsupported snapshot: {header.get('format')} v{header.get('version')}")
+                    continue
+                if not seen.get("snapshot.json"):
+                    raise SnapshotError("Snapshot header missing")
+                if not name.startswith(("documents/", "chroma/", "audio/", "search/")):
+                    raise SnapshotError(f"Unknown snapshot part {name}")
+                # Staged under a counter, never the member name, so a crafted name cannot escape the directory
+                path = os.path.join(staging, f"{len(staged):06d}")
+                with open(path, "wb") as f:
+                    f.write(data)
+                staged[name] = path
+
+        if manifest is None:
+            raise SnapshotError("Snapshot is truncated: manifest missing")
+        listed = {part["path"]: part["sha256"] for part in manifest["parts"]}
+        if listed != seen:
+            raise SnapshotError("Snapshot parts do not match its manifest")
+        return staged
+
+    def _apply(self, staged: Dict[str, str]) -> Dict[str, int]:
+        """Applies verified parts on a thread pool; returns restore counts."""
+        jobs = []
+        for name, path in staged.items():
+            if name.startswith("documents/"):
+                jobs.append(("documents", self._restore_documents, path))
+            elif name.endswith(".jsonl.gz") and name.startswith("chroma/"):
+                # A vector part needs both its rows and its embeddings
+                stem = name[:-len(".jsonl.gz")]
+                if f"{stem}.npy" not in staged:
+                    raise SnapshotError(f"Snapshot is missing the vectors for {stem}")
+                jobs.append(("chunks", self._restore_vectors, stem.split("/")[1], path, staged[f"{stem}.npy"]))
+            elif name.endswith(".npy") and name.startswith("chroma/"):
+                if f"{name[:-len('.npy')]}.jsonl.gz" not in staged:
+                    raise SnapshotError(f"Snapshot is missing the chunks for {name}")
+            elif name.startswith("audio/"):
+                jobs.append(("audio", self._restore_audio, name, path))
+            elif name.startswith("search/"):
+                jobs.append(("search_events", self._restore_search, path))
+
+        counts = {"documents": 0, "chunks": 0, "audio": 0, "search_events": 0}
+        with ThreadPoolExecutor(max_workers=settings.SNAPSHOT_RESTORE_WORKERS) as workers:
+            futures = [(counter, workers.submit(fn, *args)) for counter, fn, *args in jobs]
+            for counter, future in futures:
+                counts[counter] += future.result()
+        return counts
+
+snapshot_service = SnapshotService()
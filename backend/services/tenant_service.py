@@ -0,0 +1,163 @@
+import contextvars
+import hmac
+import math
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Deque, Optional, Tuple
+
+from core.config import settings
+from core.metrics import metrics
+
+# Tenant ids become part of Chroma collection names, which allow only these characters
+_TENANT_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,38}[A-Za-z0-9])?$")
+_LEGACY_COLLECTION = "research_papers"
+
+_current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("tenant_id", default=settings.DEFAULT_TENANT)
+# Seconds acquire() may wait for a slot; interactive requests fail fast, background work waits
+_quota_wait: contextvars.ContextVar[float] = contextvars.ContextVar("quota_wait", default=0.0)
+
+class QuotaExceeded(Exception):
+    """Raised when a tenant is over its rate or concurrency quota."""
+    def __init__(self, tenant_id: str, kind: str, reason: str, retry_after: int):
+        super().__init__(f"Tenant '{tenant_id}' exceeded its {kind} {reason} quota")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TenantService:
+    """Resolves the tenant of the current request and enforces per-tenant quotas.
+
+    The tenant travels in a context variable, so services read it without every
+    call site passing it along; background work re-enters it with scope().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        self._recent: Dict[Tuple[str, str], Deque[float]] = {}
+        self._active: Dict[Tuple[str, str], int] = {}
+
+    def resolve(self, header_value: str, api_key: str = "") -> str:
+        """Works out a request's tenant from its X-Tenant-ID and X-API-Key headers.
+
+        The tenant comes from the API key when one is sent. A bare X-Tenant-ID is
+        only honoured with TRUST_TENANT_HEADER set. Raises ValueError if the header
+        is malformed and PermissionError if the caller may not act as the tenant.
+        """
+        if header_value and not _TENANT_PATTERN.match(header_value):
+            raise ValueError("X-Tenant-ID must be 1-40 letters, digits, '-' or '_'")
+        if api_key:
+            tenant_id = self._tenant_for_key(api_key)
+            if tenant_id is None:
+                raise PermissionError("Invalid API key")
+            if header_value and header_value != tenant_id:
+                raise PermissionError(f"API key is not valid for tenant '{header_value}'")
+            return tenant_id
+        if not header_value or header_value == settings.DEFAULT_TENANT:
+            return settings.DEFAULT_TENANT
+        if not settings.TRUST_TENANT_HEADER:
+            raise PermissionError("X-Tenant-ID needs a matching X-API-Key")
+        return header_value
+
+    def _tenant_for_key(self, api_key: str) -> Optional[str]:
+        # Compare against every key so the response time does not reveal near matches
+        match = None
+        for key, tenant_id in settings.TENANT_API_KEYS.items():
+            if hmac.compare_digest(api_key.encode(), key.encode()):
+                match = tenant_id
+        return match
+
+    def current(self) -> str:
+        return _current_tenant.get()
+
+    @contextmanager
+    def scope(self, tenant_id: str):
+        token = _current_tenant.set(tenant_id)
+        try:
+            yield
+        finally:
+            _current_tenant.reset(token)
+
+    def is_default(self, tenant_id: str = None) -> bool:
+        return (tenant_id or self.current()) == settings.DEFAULT_TENANT
+
+    def collection_name(self, tenant_id: str = None) -> str:
+        tenant_id = tenant_id or self.current()
+        if self.is_default(tenant_id):
+            # Keep serving chunks stored before tenancy existed
+            return _LEGACY_COLLECTION
+        return f"{_LEGACY_COLLECTION}__{tenant_id}"
+
+    def cache_key(self, key: str) -> str:
+        """Prefixes a shared-cache key so tenants cannot observe each other's entries."""
+        return f"tenant:{self.current()}:{key}"
+
+    def _limits(self, tenant_id: str, kind: str) -> Dict[str, int]:
+        limits = dict(settings.TENANT_QUOTAS.get(kind, {}))
+        limits.update(settings.TENANT_QUOTA_OVERRIDES.get(tenant_id, {}).get(kind, {}))
+        return limits
+
+    def _blocked(self, key: Tuple[str, str], limits: Dict[str, int], now: float) -> Tuple[str, float]:
+        """Why the quota has no free slot right now and how long until it might, or (None, 0)."""
+        recent = self._recent.setdefault(key, deque())
+        while recent and now - recent[0] >= 60:
+            recent.popleft()
+        per_minute = limits.get("per_minute", 0)
+        if per_minute and len(recent) >= per_minute:
+            return "rate", 60 - (now - recent[0])
+        concurrent = limits.get("concurrent", 0)
+        if concurrent and self._active.get(key, 0) >= concurrent:
+            return "concurrency", 5
+        return None, 0
+
+    def acquire(self, kind: str, tenant_id: str = None, wait: float = None) -> str:
+        """Takes one slot of a tenant's quota, raising QuotaExceeded when none is free.
+
+        Waits up to `wait` seconds for a slot (by default, whatever the enclosing
+        waiting_for_quota() allows). Returns the tenant id to pass to release()
+        once the work has finished.
+        """
+        tenant_id = tenant_id or self.current()
+        limits = self._limits(tenant_id, kind)
+        key = (tenant_id, kind)
+        deadline = time.monotonic() + (_quota_wait.get() if wait is None else wait)
+        with self._freed:
+            while True:
+                now = time.monotonic()
+                reason, retry_after = self._blocked(key, limits, now)
+                if reason is None:
+                    break
+                if now >= deadline:
+                    metrics.quota_rejections.inc(tenant=tenant_id, kind=kind)
+                    raise QuotaExceeded(tenant_id, kind, reason, retry_after=max(1, math.ceil(retry_after)))
+                self._freed.wait(min(deadline - now, retry_after))
+            self._recent[key].append(now)
+            self._active[key] = self._active.get(key, 0) + 1
+        return tenant_id
+
+    def release(self, kind: str, tenant_id: str):
+        with self._freed:
+            key = (tenant_id, kind)
+            self._active[key] = max(0, self._active.get(key, 0) - 1)
+            self._freed.notify_all()
+
+    @contextmanager
+    def quota(self, kind: str):
+        tenant_id = self.acquire(kind)
+        try:
+            yield
+        finally:
+            self.release(kind, tenant_id)
+
+    @contextmanager
+    def waiting_for_quota(self, seconds: float):
+        """Lets quota acquisitions in this context wait up to seconds for a free slot instead of failing."""
+        token = _quota_wait.set(seconds)
+        try:
+            yield
+        finally:
+            _quota_wait.reset(token)
+
+tenant_service = TenantService()
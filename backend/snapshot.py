@@ -0,0 +1,51 @@
+"""Command-line export and restore of corpus snapshots. Run from the backend directory:
+
+    python snapshot.py export researchpilot.tar
+    python snapshot.py import researchpilot.tar
+
+Use "-" as the path to write to stdout or read from stdin, e.g. to pipe a
+snapshot straight into another host over ssh.
+"""
+import argparse
+import contextlib
+import json
+import sys
+import tarfile
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ResearchPilot corpus snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="write a snapshot").add_argument("path")
+    commands.add_parser("import", help="restore a snapshot").add_argument("path")
+    args = parser.parse_args(argv)
+
+    # Service logging goes to stderr so a snapshot written to stdout stays intact
+    with contextlib.redirect_stdout(sys.stderr):
+        from services.snapshot_service import snapshot_service, SnapshotError
+
+        try:
+            if args.command == "export":
+                if args.path == "-":
+                    manifest = snapshot_service.export(sys.__stdout__.buffer)
+                else:
+                    with open(args.path, "wb") as f:
+                        manifest = snapshot_service.export(f)
+                rows = {}
+                for part in manifest["parts"]:
+                    rows[part["kind"]] = rows.get(part["kind"], 0) + part["rows"]
+                result = {"parts": len(manifest["parts"]), "rows": rows}
+            else:
+                if args.path == "-":
+                    result = snapshot_service.restore(sys.stdin.buffer)
+                else:
+                    with open(args.path, "rb") as f:
+                        result = snapshot_service.restore(f)
+        except (SnapshotError, tarfile.TarError) as e:
+            print(f"Snapshot failed: {e}", file=sys.stderr)
+            return 1
+
+    print(json.dumps(result), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Services create their storage when imported; keep it out of the checked-in data directory
+_scratch = tempfile.mkdtemp(prefix="rp_tests_")
+os.environ["CHROMA_DB_PATH"] = os.path.join(_scratch, "chroma")
+os.environ["UPLOAD_DIR"] = os.path.join(_scratch, "uploads")
+os.environ["COORDINATION_DIR"] = os.path.join(_scratch, "coordination")
+os.environ["GEMINI_API_KEY"] = ""
+os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Points db_service at an empty in-memory Mongo collection."""
+    mongomock = pytest.importorskip("mongomock")
+    from services.db_service import db_service
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db_service, "_client", client)
+    monkeypatch.setattr(db_service, "_db", client["researchpilot_db"], raising=False)
+    monkeypatch.setattr(db_service, "_docs_collection", client["researchpilot_db"]["documents"])
+    return db_service.docs_collection
+
+@pytest.fixture
+def chroma():
+    """The real local Chroma store; every collection is dropped afterwards."""
+    from services.rag_service import rag_service
+    yield rag_service
+    for collection in rag_service._chroma().list_collections():
+        rag_service.drop_collection(getattr(collection, "name", collection))
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    """Empty upload and audio directories for the test."""
+    from core.config import settings
+    from services.audio_service import audio_service
+    uploads = tmp_path / "uploads"
+    (uploads / "audio").mkdir(parents=True)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(uploads))
+    monkeypatch.setattr(audio_service, "audio_dir", str(uploads / "audio"))
+    return uploads
@@ -0,0 +1,26 @@
+import pytest
+
+from core.config import settings
+
+@pytest.fixture
+def api():
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+@pytest.mark.parametrize("path", ["/api/metrics", "/api/metrics/prompts"])
+def test_metrics_are_disabled_without_an_admin_token(api, monkeypatch, path):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert api.get(path).status_code == 403
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}, {"Authorization": "Bearer wrong"},
+                                     {"Authorization": "s3cret"}])
+def test_metrics_refuse_missing_or_wrong_credentials(api, monkeypatch, headers):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+    assert api.get("/api/metrics", headers=headers).status_code == 401
+
+@pytest.mark.parametrize("headers", [{"X-Admin-Token": "s3cret"}, {"Authorization": "Bearer s3cret"}])
+def test_metrics_accept_the_admin_token_or_a_bearer_credential(api, monkeypatch, headers):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+    response = api.get("/api/metrics", headers=headers)
+    assert response.status_code == 200 and "researchpilot_quota_rejections_total" in response.text
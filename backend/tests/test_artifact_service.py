@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.fakes import FakeGenAIClient
+from services.artifact_service import artifact_service, ArtifactGenerationError
+from services.rag_service import rag_service
+
+@pytest.fixture
+def gemini(monkeypatch, mongo, chroma):
+    client = FakeGenAIClient()
+    monkeypatch.setattr(rag_service, "_client", client)
+    return client
+
+def add_record_without_text(mongo, document_id):
+    # Records ingested before full_text was stored only have chunks to summarize from
+    mongo.insert_one({"_id": document_id, "id": document_id, "filename": "paper.pdf", "status": "ready"})
+
+def test_summary_without_chunks_fails_and_caches_nothing(gemini, mongo):
+    add_record_without_text(mongo, "doc")
+    with pytest.raises(ArtifactGenerationError):
+        artifact_service.summary("doc")
+    assert "summary" not in mongo.find_one({"_id": "doc"})
+
+def test_summary_generation_errors_are_not_cached(gemini, mongo, monkeypatch):
+    add_record_without_text(mongo, "doc")
+    rag_service.process_and_store_document("Cloud platforms for e-learning. " * 50, "doc", {"document_id": "doc"})
+
+    def rate_limited(*args, **kwargs):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+    monkeypatch.setattr(gemini.models, "generate_content", rate_limited)
+    with pytest.raises(RuntimeError):
+        artifact_service.summary("doc")
+    assert "summary" not in mongo.find_one({"_id": "doc"})
+
+def test_summary_from_chunks_is_cached(gemini, mongo):
+    add_record_without_text(mongo, "doc")
+    rag_service.process_and_store_document("Cloud platforms for e-learning. " * 50, "doc", {"document_id": "doc"})
+    summary = artifact_service.summary("doc")
+    assert summary.startswith("Offline answer")
+    assert mongo.find_one({"_id": "doc"})["summary"] == summary
+
+def test_podcast_without_chunks_fails_and_caches_nothing(gemini, mongo):
+    add_record_without_text(mongo, "doc")
+    with pytest.raises(ArtifactGenerationError):
+        artifact_service.podcast("doc")
+    assert "podcast_script" not in mongo.find_one({"_id": "doc"})
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from services.context_service import ContextService
+
+@pytest.fixture
+def context():
+    return ContextService()
+
+def test_token_estimate_counts_words_punctuation_and_long_words(context):
+    assert context.count_tokens("") == 0
+    assert context.count_tokens("Hello, world!") == 4
+    # A 14-letter word counts as three sub-word pieces
+    assert context.count_tokens("internationals") == 3
+    assert context.count_tokens("a b") < context.count_tokens("a b c")
+
+def test_pack_chunks_follows_scores_and_skips_what_does_not_fit(context):
+    big, small = "word " * 40, "tiny chunk"
+    packed = context.pack_chunks([small, big, "other chunk"], budget=context.count_tokens(big) + 2,
+                                 scores=[0.1, 0.9, 0.5])
+    # big goes first, then the budget left holds only the better-scored of the two small chunks
+    assert packed == [big.strip(), "other chunk"]
+    assert context.pack_chunks([big, small], budget=5) == [small]
+
+def test_pack_chunks_drops_duplicates_and_blanks(context):
+    assert context.pack_chunks(["a", " a ", "", None, "  ", "b"], budget=100) == ["a", "b"]
+
+def test_fit_text_returns_short_text_unchanged(context):
+    assert context.fit_text("Short text.", 100) == "Short text."
+    assert context.fit_text(None, 100) == ""
+
+def test_fit_text_stays_in_budget_and_ends_on_a_sentence(context):
+    text = " ".join(f"Sentence number {i} talks about cloud learning." for i in range(200))
+    fitted = context.fit_text(text, 100)
+    assert context.count_tokens(fitted) <= 100
+    assert fitted.endswith(".") and text.startswith(fitted)
+
+def test_fit_text_cuts_mid_sentence_when_no_boundary_is_near(context):
+    text = "word " * 500
+    fitted = context.fit_text(text, 50)
+    assert 0 < context.count_tokens(fitted) <= 50
+
+def test_strip_boilerplate_removes_running_headers_and_page_numbers(context):
+    pages = [f"Journal of Cloud Learning, Vol. 3\nBody text of page {i}.\nPage {i} of 4" for i in range(1, 5)]
+    cleaned = context.strip_boilerplate("\n".join(pages))
+    assert "Journal of Cloud Learning" not in cleaned and "of 4" not in cleaned
+    assert all(f"Body text of page {i}." in cleaned for i in range(1, 5))
+
+def test_strip_boilerplate_cuts_the_trailing_reference_list(context):
+    body = "Introduction\n" + "".join(f"Finding {i} about e-learning.\n" for i in range(20))
+    cleaned = context.strip_boilerplate(body + "References\n[1] Smith, J. Cloud platforms. 2020.")
+    assert "Smith" not in cleaned and cleaned.endswith("Finding 19 about e-learning.")
+
+def test_strip_boilerplate_keeps_an_early_references_heading(context):
+    text = "References\nThis section reviews prior work.\n" + "More content here.\n" * 5
+    assert "prior work" in context.strip_boilerplate(text)
+
+def test_record_prompt_logs_json_and_keeps_stats(context, capsys):
+    context.record_prompt("query", "What is the dropout rate?")
+    context.record_prompt("query", "Hi")
+    line = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert line == {"event": "prompt", "endpoint": "query", "prompt_tokens": 7, "budget": context.budget_for("query")}
+    stats = context.get_prompt_metrics()["query"]
+    assert stats["prompts"] == 2 and stats["max_tokens"] == 7 and stats["total_tokens"] == 8
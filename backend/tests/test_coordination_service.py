@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.config import settings
+from services.coordination_service import FileCacheBackend, FileLockBackend, LockTimeout, MongoLockBackend
+
+@pytest.fixture
+def file_locks(tmp_path):
+    return FileLockBackend(str(tmp_path / "locks"))
+
+def run_concurrently(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+def test_file_lock_admits_one_holder_at_a_time(file_locks):
+    inside, overlaps, entries = [0], [], []
+
+    def work():
+        with file_locks.hold("doc", timeout=10):
+            inside[0] += 1
+            overlaps.append(inside[0])
+            time.sleep(0.02)
+            inside[0] -= 1
+            entries.append(1)
+
+    run_concurrently(work, 8)
+    assert len(entries) == 8 and max(overlaps) == 1
+
+def test_file_lock_times_out_while_held(file_locks):
+    with file_locks.hold("doc", timeout=1):
+        started = time.monotonic()
+        with pytest.raises(LockTimeout):
+            with file_locks.hold("doc", timeout=0.2):
+                pass
+        assert time.monotonic() - started >= 0.2
+        with file_locks.hold("other", timeout=0.2):
+            pass
+
+def test_file_lock_is_released_when_its_holder_dies(file_locks):
+    if not hasattr(os, "fork"):
+        pytest.skip("needs fork")
+    pid = os.fork()
+    if pid == 0:
+        with file_locks.hold("doc", timeout=1):
+            os._exit(0)
+    os.waitpid(pid, 0)
+    with file_locks.hold("doc", timeout=0.5):
+        pass
+
+def test_lock_files_are_removed_on_release(file_locks):
+    def work():
+        with file_locks.hold("doc", timeout=10):
+            time.sleep(0.01)
+
+    run_concurrently(work, 6)
+    for i in range(20):
+        with file_locks.hold(f"document-{i}", timeout=1):
+            pass
+    assert os.listdir(file_locks.lock_dir) == []
+
+@pytest.fixture
+def mongo_locks(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setattr(settings, "LOCK_TTL_SECONDS", 60)
+    return MongoLockBackend(mongomock.MongoClient()["researchpilot_db"]["locks"])
+
+def add_lease(locks, key, expires_in):
+    locks.collection.insert_one({"_id": key, "owner": "crashed-worker",
+                                 "expires_at": datetime.now(timezone.utc) + timedelta(seconds=expires_in)})
+
+def test_live_lease_blocks_other_workers(mongo_locks):
+    add_lease(mongo_locks, "doc", expires_in=60)
+    with pytest.raises(LockTimeout):
+        with mongo_locks.hold("doc", timeout=0.2):
+            pass
+
+def test_expired_lease_is_taken_over(mongo_locks):
+    add_lease(mongo_locks, "doc", expires_in=-1)
+    with mongo_locks.hold("doc", timeout=1):
+        assert mongo_locks.collection.find_one({"_id": "doc"})["owner"] != "crashed-worker"
+    assert mongo_locks.collection.count_documents({}) == 0
+
+def test_heartbeat_keeps_a_long_hold_from_expiring(mongo_locks, monkeypatch):
+    monkeypatch.setattr(settings, "LOCK_TTL_SECONDS", 0.3)
+    with mongo_locks.hold("doc", timeout=1):
+        time.sleep(0.6)
+        with pytest.raises(LockTimeout):
+            with mongo_locks.hold("doc", timeout=0.1):
+                pass
+
+@pytest.fixture
+def file_cache(tmp_path):
+    return FileCacheBackend(str(tmp_path / "cache"))
+
+def test_file_cache_returns_values_until_they_expire(file_cache, monkeypatch):
+    file_cache.set("wiki:cloud", {"pages": [1, 2]}, ttl=60)
+    assert file_cache.get("wiki:cloud") == {"pages": [1, 2]}
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert file_cache.get("wiki:cloud") is None
+
+def test_file_cache_treats_missing_or_corrupt_entries_as_misses(file_cache):
+    assert file_cache.get("never-set") is None
+    file_cache.set("key", "value", ttl=60)
+    with open(file_cache._path("key"), "w") as f:
+        f.write("{not json")
+    assert file_cache.get("key") is None
@@ -0,0 +1,53 @@
+import base64
+
+import pytest
+
+from services.db_service import DBService
+from services.tenant_service import tenant_service
+
+def test_cursor_round_trips_created_at_and_id():
+    db = DBService()
+    cursor = db._encode_cursor({"created_at": 1700000000.25, "id": "abc"})
+    assert db._decode_cursor(cursor) == (1700000000.25, "abc")
+
+def test_records_without_created_at_sort_as_oldest():
+    db = DBService()
+    assert db._decode_cursor(db._encode_cursor({"id": "abc"})) == (0.0, "abc")
+
+@pytest.mark.parametrize("cursor", ["not base64!", base64.urlsafe_b64encode(b"{}").decode(),
+                                    base64.urlsafe_b64encode(b'["x", "abc"]').decode(), ""])
+def test_foreign_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        DBService()._decode_cursor(cursor)
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip("mongomock")
+    service = DBService()
+    service.docs_collection = mongomock.MongoClient()["researchpilot_db"]["documents"]
+    return service
+
+def test_pages_cover_every_document_once(db):
+    # Equal timestamps exercise the id tie-break
+    for i in range(7):
+        db.docs_collection.insert_one({"_id": f"doc{i}", "filename": f"{i}.pdf", "created_at": float(i // 2)})
+    seen, cursor = [], None
+    while True:
+        cards, cursor = db.list_documents(limit=3, cursor=cursor)
+        seen += [card["id"] for card in cards]
+        if cursor is None:
+            break
+    assert seen == ["doc6", "doc5", "doc4", "doc3", "doc2", "doc1", "doc0"]
+
+def test_last_full_page_has_no_cursor(db):
+    for i in range(3):
+        db.docs_collection.insert_one({"_id": f"doc{i}", "filename": f"{i}.pdf", "created_at": float(i)})
+    cards, cursor = db.list_documents(limit=3)
+    assert len(cards) == 3 and cursor is None
+
+def test_listing_is_scoped_to_the_tenant(db):
+    db.docs_collection.insert_one({"_id": "mine", "filename": "a.pdf", "created_at": 1.0, "tenant_id": "acme"})
+    db.docs_collection.insert_one({"_id": "theirs", "filename": "b.pdf", "created_at": 2.0, "tenant_id": "globex"})
+    with tenant_service.scope("acme"):
+        cards, _ = db.list_documents()
+    assert [card["id"] for card in cards] == ["mine"]
@@ -0,0 +1,93 @@
+import glob
+import os
+
+import pytest
+
+from services.document_service import document_service
+
+pymupdf = pytest.importorskip("pymupdf")
+
+FIXTURE = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "*.pdf")))[0]
+
+@pytest.fixture(scope="module")
+def paper():
+    return document_service.extract_structured(FIXTURE)
+
+def write_pdf(path, pages):
+    """Writes pages of (text, fontsize, bold) lines, one line per text block."""
+    doc = pymupdf.open()
+    for lines in pages:
+        page = doc.new_page()
+        page.insert_text((72, 30), "Cloud Learning Review", fontsize=9)
+        y = 80
+        for text, size, bold in lines:
+            y += 40
+            page.insert_text((72, y), text, fontsize=size, fontname="hebo" if bold else "helv")
+        page.insert_text((72, page.rect.height - 20), str(page.number + 1), fontsize=9)
+    doc.save(str(path))
+    return str(path)
+
+def body(text):
+    return (text, 10, False)
+
+def test_fixture_sections_are_the_numbered_headings(paper):
+    titles = [s["title"] for s in paper["sections"]]
+    assert titles == [
+        "AN OVERVIEW OF CLOUD COMPUTING FOR THE ADVANCEMENT OF THE E-LEARNING PROCESS",
+        "ABSTRACT",
+        "1. INTRODUCTION",
+        "2. FUNDAMENTAL NOTIONS OF CLOUD COMPUTING",
+        "3. E-LEARNING TASKS AND CLOUD COMPUTING",
+        "4. PERSPECTIVE CHALLENGES E- LEARNING AND CLOUD COMPUTING",
+        "5. CONCLUSION",
+    ]
+    for section in paper["sections"]:
+        assert paper["text"][section["start"]:].startswith(section["title"])
+        assert section["start"] < section["end"] <= len(paper["text"])
+
+def test_fixture_running_headers_and_references_are_removed(paper):
+    assert "Journal of Theoretical and Applied Information Technology" not in paper["text"]
+    assert paper["stats"]["removed_running_lines"] > 0
+    assert "REFERENCES" not in paper["text"]
+    assert paper["references"].startswith("[1] Alam, T. (2021).")
+
+def test_fixture_page_map_covers_the_text_in_order(paper):
+    page_map = paper["page_map"]
+    assert [p["page"] for p in page_map] == sorted(p["page"] for p in page_map)
+    assert page_map[0]["start"] == 0 and page_map[-1]["end"] <= len(paper["text"])
+    for previous, current in zip(page_map, page_map[1:]):
+        assert previous["end"] <= current["start"]
+
+def test_hyphenated_line_breaks_are_rejoined(tmp_path):
+    path = write_pdf(tmp_path / "paper.pdf", [[("1. Introduction", 10, True), body("Students in distance edu-"),
+                                                body("cation use cloud plat-"), body("forms for e-learning.")]])
+    text = document_service.extract_structured(path)["text"]
+    assert "distance education use cloud platforms for e-learning." in text
+
+def test_bold_terms_inside_the_body_are_not_headings(tmp_path):
+    path = write_pdf(tmp_path / "paper.pdf", [[("1. Introduction", 10, True), body("Our study covers"),
+                                                ("Moodle Analytics", 10, True), body("and its adoption.")],
+                                               [("Results Overview", 14, False), body("Adoption rose.")]])
+    titles = [s["title"] for s in document_service.extract_structured(path)["sections"]]
+    assert titles == ["1. Introduction", "Results Overview"]
+
+def test_running_headers_and_page_numbers_are_dropped(tmp_path):
+    path = write_pdf(tmp_path / "paper.pdf", [[body(f"Findings on page {i}.")] for i in range(4)])
+    structure = document_service.extract_structured(path)
+    assert "Cloud Learning Review" not in structure["text"]
+    assert structure["stats"]["removed_running_lines"] == 8
+    assert [p["page"] for p in structure["page_map"]] == [1, 2, 3, 4]
+    for entry, i in zip(structure["page_map"], range(4)):
+        assert structure["text"][entry["start"]:entry["end"]] == f"Findings on page {i}."
+
+def test_reference_list_is_split_off(tmp_path):
+    path = write_pdf(tmp_path / "paper.pdf", [[("1. Method", 10, True), body("We surveyed teachers.")],
+                                               [("References", 10, True), body("[1] Smith, J. (2020). Clouds.")]])
+    structure = document_service.extract_structured(path)
+    assert structure["text"] == "1. Method\n\nWe surveyed teachers."
+    assert structure["references"] == "[1] Smith, J. (2020). Clouds."
+
+def test_unreadable_file_gives_an_empty_structure(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+    assert document_service.extract_structured(str(path))["text"] == ""
@@ -0,0 +1,180 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from core.config import settings
+from services.maintenance_service import maintenance_service
+from services.tenant_service import tenant_service
+
+A_DAY_AGO = time.time() - 86400
+
+def add_chunks(rag, document_id, count=3, tenant_id=None):
+    collection = rag.collection_for(tenant_id or settings.DEFAULT_TENANT)
+    collection.add(
+        ids=[f"{document_id}_chunk_{i}" for i in range(count)],
+        documents=[f"chunk {i} of {document_id}" for i in range(count)],
+        embeddings=[[float(i + 1), 1.0, 0.0, 0.5] for i in range(count)],
+        metadatas=[{"document_id": document_id, "chunk_index": i} for i in range(count)],
+    )
+
+def chunk_owners(rag, tenant_id=None):
+    metadatas = rag.collection_for(tenant_id or settings.DEFAULT_TENANT).get(include=["metadatas"])["metadatas"]
+    return {m["document_id"] for m in metadatas}
+
+def add_record(mongo, document_id, status="ready", tenant_id=settings.DEFAULT_TENANT, updated_at=None):
+    mongo.insert_one({"_id": document_id, "id": document_id, "filename": f"{document_id}.pdf", "status": status,
+                      "tenant_id": tenant_id, "created_at": A_DAY_AGO, "updated_at": updated_at or A_DAY_AGO})
+
+def add_file(path, age=86400):
+    with open(path, "wb") as f:
+        f.write(b"x" * 100)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return str(path)
+
+@pytest.fixture
+def stores(mongo, chroma, storage):
+    return mongo, chroma, storage
+
+def test_delete_document_removes_only_that_document(stores):
+    mongo, rag, uploads = stores
+    gone, kept = str(uuid.uuid4()), str(uuid.uuid4())
+    for document_id in (gone, kept):
+        add_record(mongo, document_id)
+        add_chunks(rag, document_id)
+        add_file(uploads / f"{document_id}.pdf")
+        add_file(uploads / "audio" / f"{document_id}.mp3")
+
+    report = maintenance_service.delete_document(gone)
+
+    assert report["chunks_deleted"] == 3 and report["reclaimed_bytes"] == 200
+    assert mongo.find_one({"_id": gone})["status"] == "deleted"
+    assert mongo.find_one({"_id": kept})["status"] == "ready"
+    assert chunk_owners(rag) == {kept}
+    assert sorted(os.listdir(uploads)) == sorted(["audio", f"{kept}.pdf"])
+    assert os.listdir(uploads / "audio") == [f"{kept}.mp3"]
+
+def test_delete_document_is_scoped_to_the_tenant(stores):
+    mongo, rag, _ = stores
+    add_record(mongo, "theirs", tenant_id="acme")
+    add_chunks(rag, "theirs", tenant_id="acme")
+    assert maintenance_service.delete_document("theirs") is None
+    assert chunk_owners(rag, "acme") == {"theirs"}
+    with tenant_service.scope("acme"):
+        assert maintenance_service.delete_document("theirs")["chunks_deleted"] == 3
+
+def test_gc_keeps_live_data_and_removes_what_nothing_references(stores):
+    mongo, rag, uploads = stores
+    live, failed, deleted, missing = (str(uuid.uuid4()) for _ in range(4))
+    add_record(mongo, live)
+    add_record(mongo, failed, status="error")
+    add_record(mongo, deleted, status="deleted", updated_at=time.time())
+    for document_id in (live, failed, deleted, missing):
+        add_chunks(rag, document_id)
+        add_file(uploads / f"{document_id}.pdf")
+        add_file(uploads / "audio" / f"{document_id}.mp3")
+    young_orphan = add_file(uploads / f"{uuid.uuid4()}.pdf", age=0)
+    not_an_upload = add_file(uploads / "notes.txt")
+
+    report = maintenance_service.gc()
+
+    assert chunk_owners(rag) == {live}
+    assert report["documents_purged_from_index"] == 3 and report["chunks_deleted"] == 9
+    remaining = set(os.listdir(uploads))
+    assert {f"{live}.pdf", os.path.basename(young_orphan), os.path.basename(not_an_upload)} <= remaining
+    assert not {f"{failed}.pdf", f"{deleted}.pdf", f"{missing}.pdf"} & remaining
+    # Errored documents keep their podcast; deleted and unknown ones do not
+    assert set(os.listdir(uploads / "audio")) == {f"{live}.mp3", f"{failed}.mp3"}
+    assert mongo.count_documents({}) == 3
+
+def test_gc_drops_empty_tenant_collections_but_keeps_live_tenants(stores):
+    mongo, rag, _ = stores
+    add_record(mongo, "acme-doc", tenant_id="acme")
+    add_chunks(rag, "acme-doc", tenant_id="acme")
+    add_chunks(rag, "orphan", tenant_id="globex")
+
+    report = maintenance_service.gc()
+
+    assert report["collections_dropped"] == [tenant_service.collection_name("globex")]
+    assert chunk_owners(rag, "acme") == {"acme-doc"}
+
+def test_gc_purges_only_expired_tombstones(stores, monkeypatch):
+    mongo, _, _ = stores
+    monkeypatch.setattr(settings, "GC_TOMBSTONE_SECONDS", 3600)
+    add_record(mongo, "old", status="deleted", updated_at=time.time() - 7200)
+    add_record(mongo, "recent", status="deleted", updated_at=time.time() - 60)
+    assert maintenance_service.gc()["tombstones_purged"] == 1
+    assert [doc["_id"] for doc in mongo.find({})] == ["recent"]
+
+def test_fail_stale_processing_respects_the_age_boundary(mongo):
+    from services.db_service import db_service
+    before = time.time() - 100
+    add_record(mongo, "stale", status="processing", updated_at=before - 1)
+    add_record(mongo, "boundary", status="processing", updated_at=before)
+    add_record(mongo, "fresh", status="processing", updated_at=before + 50)
+    add_record(mongo, "done", status="ready", updated_at=before - 1000)
+
+    assert db_service.fail_stale_processing(before) == 1
+    statuses = {doc["_id"]: doc["status"] for doc in mongo.find({})}
+    assert statuses == {"stale": "error", "boundary": "processing", "fresh": "processing", "done": "ready"}
+
+def test_compaction_removes_orphaned_segment_directories_only(stores):
+    _, rag, _ = stores
+    add_chunks(rag, "doc")
+    orphan = os.path.join(settings.CHROMA_DB_PATH, str(uuid.uuid4()))
+    os.makedirs(orphan)
+    add_file(os.path.join(orphan, "data_level0.bin"))
+    other = os.path.join(settings.CHROMA_DB_PATH, "not-a-segment")
+    os.makedirs(other, exist_ok=True)
+    segments = maintenance_service._segment_ids()
+
+    report = maintenance_service.compact_chroma()
+
+    assert report["segments_removed"] == 1
+    assert not os.path.exists(orphan) and os.path.exists(other)
+    assert maintenance_service._segment_ids() == segments
+    assert chunk_owners(rag) == {"doc"}
+
+def test_rebuild_keeps_every_chunk(stores, monkeypatch):
+    _, rag, _ = stores
+    add_chunks(rag, "a", count=5)
+    add_chunks(rag, "b", count=4)
+    monkeypatch.setattr(maintenance_service, "_is_bloated", lambda collection: True)
+
+    report = maintenance_service.compact_chroma()
+
+    collection = rag.collection_for(settings.DEFAULT_TENANT)
+    assert report["collections_rebuilt"] == [tenant_service.collection_name(settings.DEFAULT_TENANT)]
+    assert collection.count() == 9 and chunk_owners(rag) == {"a", "b"}
+    names = {getattr(c, "name", c) for c in rag._chroma().list_collections()}
+    assert names == {tenant_service.collection_name(settings.DEFAULT_TENANT)}
+
+def test_rebuild_carries_over_writes_made_during_the_swap(stores, monkeypatch):
+    _, rag, _ = stores
+    add_chunks(rag, "a", count=5)
+    old = rag.collection_for(settings.DEFAULT_TENANT)
+    replace = rag.replace_collection
+
+    def racing_replace(name, replacement_name):
+        # Another worker writes through its handle on the old collection
+        old.add(ids=["late_chunk_0"], documents=["late"], embeddings=[[9.0, 1.0, 0.0, 0.5]],
+                metadatas=[{"document_id": "late", "chunk_index": 0}])
+        old.delete(ids=["a_chunk_0"])
+        return replace(name, replacement_name)
+
+    monkeypatch.setattr(rag, "replace_collection", racing_replace)
+    assert maintenance_service._rebuild(tenant_service.collection_name(settings.DEFAULT_TENANT))
+
+    ids = set(rag.collection_for(settings.DEFAULT_TENANT).get(include=[])["ids"])
+    assert ids == {"late_chunk_0"} | {f"a_chunk_{i}" for i in range(1, 5)}
+
+def test_handles_survive_another_worker_dropping_the_collection(chroma):
+    rag = chroma
+    add_chunks(rag, "a", tenant_id="acme")
+    handle = rag.collection_for("acme")
+    # Another worker's GC drops the collection behind this worker's cached handle
+    rag._chroma().delete_collection(tenant_service.collection_name("acme"))
+
+    add_chunks(rag, "b", tenant_id="acme")
+    assert handle.count() == 3 and chunk_owners(rag, "acme") == {"b"}
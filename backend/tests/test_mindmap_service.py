@@ -0,0 +1,65 @@
+import pytest
+
+from core.config import settings
+from services.mindmap_service import IncrementalJSONParser, MindmapParseError, mindmap_service
+
+def parse(*pieces):
+    parser = IncrementalJSONParser()
+    for piece in pieces:
+        parser.feed(piece)
+    return parser.result()
+
+def test_complete_document_parses_unchanged():
+    assert parse('{"name": "A", "children": [{"name": "B"}]}') == {"name": "A", "children": [{"name": "B"}]}
+
+def test_text_before_the_json_is_skipped():
+    assert parse('```json\n{"name": "A"}\n```') == {"name": "A"}
+
+def test_truncated_mid_string_is_cut_back_to_the_last_safe_point():
+    # The unfinished node is cut back to the point where it was opened; normalize() drops it
+    tree = parse('{"name": "A", "children": [{"name": "B", "children": []}, {"name": "Unfini')
+    assert tree == {"name": "A", "children": [{"name": "B", "children": []}, {}]}
+    assert mindmap_service.normalize(tree) == {"name": "A", "children": [{"name": "B", "children": []}]}
+
+def test_truncation_repair_works_across_piece_boundaries():
+    tree = parse('{"name": "A", "chil', 'dren": [{"name": "B"}', ', {"name": "C\\"quoted')
+    assert tree == {"name": "A", "children": [{"name": "B"}, {}]}
+
+def test_braces_inside_strings_are_not_structure():
+    assert parse('{"name": "set {x} [y]", "children": [') == {"name": "set {x} [y]", "children": []}
+
+def test_output_without_json_raises():
+    with pytest.raises(MindmapParseError):
+        parse("Sorry, I cannot help with that.")
+
+def test_parser_counts_objects_for_early_stop():
+    parser = IncrementalJSONParser()
+    parser.feed('{"name": "A", "children": [{"name": "B"}, {"name": "C"}]}')
+    assert parser.objects == 3
+
+def test_normalize_enforces_depth_fanout_and_node_limits(monkeypatch):
+    monkeypatch.setattr(settings, "MINDMAP_MAX_DEPTH", 2)
+    monkeypatch.setattr(settings, "MINDMAP_MAX_CHILDREN", 3)
+    monkeypatch.setattr(settings, "MINDMAP_MAX_NODES", 3)
+    tree = {"name": "Root", "children": [
+        {"name": f"C{i}", "children": [{"name": "too deep"}]} for i in range(5)
+    ]}
+    assert mindmap_service.normalize(tree) == {"name": "Root", "children": [
+        {"name": "C0", "children": []},
+        {"name": "C1", "children": []},
+    ]}
+
+def test_normalize_falls_back_to_the_title_and_drops_unnamed_nodes():
+    tree = [{"children": [{"name": "  Problem \n statement "}, {"label": "no name"}, "junk"]}]
+    assert mindmap_service.normalize(tree, fallback_title="Paper") == {
+        "name": "Paper", "children": [{"name": "Problem statement", "children": []}]
+    }
+
+def test_response_schema_is_unrolled_to_the_depth_limit():
+    schema = mindmap_service.response_schema()
+    depth = 1
+    while "children" in schema["properties"]:
+        assert schema["properties"]["children"]["maxItems"] == settings.MINDMAP_MAX_CHILDREN
+        schema = schema["properties"]["children"]["items"]
+        depth += 1
+    assert depth == settings.MINDMAP_MAX_DEPTH
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from benchmarks.fakes import FakeGenAIClient, fake_embedding
+from core.config import settings
+from services.context_service import context_service
+from services.rag_service import rag_service
+
+NO_CONTEXT = "No relevant context found in the document to answer your query."
+
+class ScriptedCollection:
+    """Returns fixed chunks per query text, recognised by its fake embedding."""
+    def __init__(self, chunks_by_query: dict):
+        self.chunks_by_query = {tuple(fake_embedding(q)): chunks for q, chunks in chunks_by_query.items()}
+
+    def query(self, query_embeddings, n_results=5, where=None, **kwargs):
+        return {"documents": [self.chunks_by_query[tuple(e)][:n_results] for e in query_embeddings]}
+
+@pytest.fixture
+def gemini(monkeypatch):
+    client = FakeGenAIClient()
+    monkeypatch.setattr(rag_service, "_client", client)
+    monkeypatch.setattr(settings, "RERANK_SCORER", "none")
+    return client
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    def script(chunks_by_query):
+        collection = ScriptedCollection(chunks_by_query)
+        monkeypatch.setattr(type(rag_service), "collection", property(lambda self: collection))
+    return script
+
+def run_batch(queries):
+    items = list(rag_service.query_batch(queries))
+    return [item for item in items if "index" in item], items[-1]["stats"]
+
+def test_grouped_queries_send_each_shared_chunk_once():
+    groups = rag_service._group_queries([["a", "b"], ["c"], ["b", "a"]], budget=10_000)
+    assert [g["indexes"] for g in groups] == [[0, 1, 2]]
+    assert groups[0]["chunks"] == ["a", "b", "c"]
+
+def test_groups_respect_the_size_limit_and_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_BATCH_GROUP_SIZE", 2)
+    groups = rag_service._group_queries([["a"], ["a"], ["a"]], budget=10_000)
+    assert [g["indexes"] for g in groups] == [[0, 1], [2]]
+
+    chunk = "word " * 50
+    budget = context_service.count_tokens(chunk) + 1
+    groups = rag_service._group_queries([[chunk], [chunk + "x"]], budget=budget)
+    assert [g["indexes"] for g in groups] == [[0], [1]]
+
+def test_queries_without_chunks_are_never_grouped():
+    groups = rag_service._group_queries([[], ["a"], [], ["b"]], budget=10_000)
+    assert sorted(i for g in groups for i in g["indexes"]) == [1, 3]
+    assert rag_service._group_queries([[], []], budget=10_000) == []
+
+def test_empty_retrieval_answers_without_a_prompt(gemini, retrieval):
+    retrieval({"what is it?": ["Cloud platforms host e-learning."], "unrelated?": []})
+    answers, stats = run_batch(["what is it?", "unrelated?"])
+    by_index = {a["index"]: a["answer"] for a in answers}
+    assert by_index[0].startswith("Offline answer") and by_index[1] == NO_CONTEXT
+    assert stats["prompts"] == 1 and gemini.models.generate_calls == 1
+
+def test_every_query_gets_exactly_one_line_and_stats_come_last(gemini, retrieval):
+    queries = [f"question {i}?" for i in range(6)]
+    retrieval({q: ([] if i % 3 == 0 else [f"chunk {i % 2}", "shared chunk"]) for i, q in enumerate(queries)})
+    items = list(rag_service.query_batch(queries))
+    assert "stats" in items[-1] and all("index" in item for item in items[:-1])
+    assert sorted(item["index"] for item in items[:-1]) == list(range(6))
+    assert all(item["query"] == queries[item["index"]] for item in items[:-1])
+    # Answers needing no prompt are sent before any generated one
+    assert [item["index"] for item in items[:2]] == [0, 3]
+
+def test_a_failing_prompt_becomes_an_error_line_for_its_queries_only(gemini, retrieval, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_BATCH_GROUP_SIZE", 1)
+    retrieval({"good?": ["good chunk"], "bad?": ["bad chunk"]})
+    generate = gemini.models.generate_content
+
+    def flaky(model, contents, config=None):
+        if "bad chunk" in str(contents):
+            raise RuntimeError("backend unavailable")
+        return generate(model, contents, config)
+    monkeypatch.setattr(gemini.models, "generate_content", flaky)
+
+    answers, _ = run_batch(["good?", "bad?"])
+    by_index = {a["index"]: a["answer"] for a in answers}
+    assert by_index[0].startswith("Offline answer")
+    assert by_index[1] == "Error during query generation: backend unavailable"
+
+def test_endpoint_streams_one_json_object_per_line(gemini, retrieval):
+    from fastapi.testclient import TestClient
+    from main import app
+    retrieval({"one?": ["chunk"], "two?": []})
+    response = TestClient(app).post("/api/query_batch", json={"queries": ["one?", " ", "two?"]})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"index": 1, "query": "two?", "answer": NO_CONTEXT}
+    assert lines[1]["index"] == 0 and "stats" in lines[2]
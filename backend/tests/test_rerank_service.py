@@ -0,0 +1,74 @@
+import pytest
+
+from core.config import settings
+from services.rerank_service import RerankService
+
+BUDGET = 10_000
+
+@pytest.fixture
+def reranker(monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_SCORER", "bm25")
+    monkeypatch.setattr(settings, "RERANK_KEEP", 4)
+    monkeypatch.setattr(settings, "RERANK_WEIGHTS", {"bm25": 0.5, "vector": 0.5})
+    return RerankService()
+
+def test_bm25_rewards_matching_terms_and_ignores_stopwords(reranker):
+    scores = reranker._bm25("What is the dropout rate?", [
+        "the what is the of",
+        "dropout rate of students",
+        "dropout dropout dropout rate in online courses",
+        "cloud platforms",
+    ])
+    assert scores[0] == 0 and scores[3] == 0
+    assert scores[2] > scores[1] > 0
+
+def test_rare_terms_outweigh_common_ones(reranker):
+    chunks = ["cloud learning", "cloud learning", "cloud learning", "cloud moodle"]
+    scores = reranker._bm25("cloud moodle", chunks)
+    assert scores[3] == max(scores) and scores[0] == scores[1] == scores[2]
+
+@pytest.mark.parametrize("weights, best", [({"bm25": 1.0, "vector": 0.0}, 1), ({"bm25": 0.0, "vector": 1.0}, 0)])
+def test_weights_choose_between_lexical_and_vector_evidence(reranker, monkeypatch, weights, best):
+    monkeypatch.setattr(settings, "RERANK_WEIGHTS", weights)
+    # Chunk 0 is nearest in vector space; chunk 1 is the only one mentioning the query term
+    scores = reranker._score_linear("moodle", ["cloud platforms", "moodle adoption", "e-learning"], [0.9, 0.1, 0.5])
+    assert max(range(3), key=lambda i: scores[i]) == best
+
+def test_scores_are_normalised_to_the_weights(reranker):
+    scores = reranker._score_linear("moodle", ["moodle", "cloud"], [1.0, 0.0])
+    assert scores == [1.0, 0.0]
+
+def test_keeps_at_most_rerank_keep_and_top_k(reranker, monkeypatch):
+    chunks = [f"chunk {i} about topic" for i in range(10)]
+    distances = [float(i) for i in range(10)]
+    assert len(reranker.rerank("topic", chunks, distances, 5, BUDGET, "query")) == 4
+    assert len(reranker.rerank("topic", chunks, distances, 2, BUDGET, "query")) == 2
+    monkeypatch.setattr(settings, "RERANK_KEEP", 8)
+    assert len(reranker.rerank("topic", chunks, distances, 6, BUDGET, "query")) == 6
+
+def test_best_candidates_survive_the_cutoff(reranker):
+    chunks = ["cloud computing basics", "history of universities", "moodle dropout prediction",
+              "statistics primer", "moodle dropout rates", "unrelated appendix"]
+    kept = reranker.rerank("moodle dropout", chunks, [0.1, 0.2, 0.3, 0.4, 0.5, 0.6], 2, BUDGET, "query")
+    assert kept == ["moodle dropout prediction", "moodle dropout rates"]
+
+def test_ties_keep_chroma_order(reranker):
+    chunks = [f"identical chunk {n}" for n in "abcdef"]
+    kept = reranker.rerank("nothing in common", chunks, [0.5] * 6, 4, BUDGET, "query")
+    assert kept == chunks[:4]
+    assert reranker.rerank("nothing in common", chunks, [0.5] * 6, 4, BUDGET, "query") == kept
+
+def test_without_distances_rank_order_stands_in_for_similarity(reranker, monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_WEIGHTS", {"bm25": 0.0, "vector": 1.0})
+    chunks = [f"chunk {n}" for n in "abcdef"]
+    assert reranker.rerank("query", chunks, None, 3, BUDGET, "query") == chunks[:3]
+
+def test_disabled_reranking_returns_chromas_top_k(reranker, monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_SCORER", "none")
+    chunks = ["unrelated", "", "moodle dropout", "  ", "more"]
+    assert reranker.rerank("moodle dropout", chunks, None, 2, BUDGET, "query") == ["unrelated", "moodle dropout"]
+    assert reranker.candidates_for(5) == 5
+
+def test_over_fetches_candidates_when_enabled(reranker, monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_CANDIDATES", 20)
+    assert reranker.candidates_for(5) == 20 and reranker.candidates_for(30) == 30
@@ -0,0 +1,69 @@
+import json
+import time
+
+import pytest
+
+from services.search_service import SearchService
+
+DAY = 86400
+
+@pytest.fixture
+def search(tmp_path):
+    service = SearchService()
+    service.db_path = str(tmp_path / "search_data.json")
+    service._ensure_db()
+    return service
+
+def write_history(service, searches=(), interactions=(), rollups=()):
+    with open(service.db_path, "w") as f:
+        json.dump({"searches": list(searches), "interactions": list(interactions), "rollups": list(rollups)}, f)
+
+def search_event(query, age_days, user_id="u1", tenant_id="default"):
+    return {"user_id": user_id, "query": query, "timestamp": time.time() - age_days * DAY, "tenant_id": tenant_id}
+
+def test_old_events_become_daily_rollups(search):
+    write_history(search, searches=[
+        search_event("transformers", 100), search_event("transformers", 100), search_event("rnn", 100),
+        search_event("recent", 1),
+    ])
+    report = search.rollup_history(retention_days=90, max_events=100)
+    db = search.export_history()
+    assert report["events_rolled_up"] == 3
+    assert [e["query"] for e in db["searches"]] == ["recent"]
+    [rollup] = db["rollups"]
+    assert rollup["kind"] == "searches" and rollup["user_id"] == "u1" and rollup["count"] == 3
+    assert rollup["top"] == {"transformers": 2, "rnn": 1}
+
+def test_overflow_beyond_max_events_rolls_up_the_oldest(search):
+    write_history(search, searches=[search_event(f"q{i}", 5 - i) for i in range(5)])
+    report = search.rollup_history(retention_days=90, max_events=2)
+    assert report["events_rolled_up"] == 3
+    assert [e["query"] for e in search.export_history()["searches"]] == ["q3", "q4"]
+
+def test_rollups_are_kept_apart_per_tenant_and_user(search):
+    write_history(search, interactions=[
+        {**search_event(None, 100, "u1", "acme"), "title": "A"},
+        {**search_event(None, 100, "u1", "globex"), "title": "A"},
+        {**search_event(None, 100, "u2", "acme"), "title": "B"},
+    ])
+    search.rollup_history(retention_days=90, max_events=100)
+    keys = {(r["tenant_id"], r["user_id"]) for r in search.export_history()["rollups"]}
+    assert keys == {("acme", "u1"), ("globex", "u1"), ("acme", "u2")}
+
+def test_repeated_runs_merge_into_existing_rollups(search):
+    # The same timestamp both times, so both events fall on the same day
+    event = search_event("a", 100)
+    write_history(search, searches=[event])
+    search.rollup_history(retention_days=90, max_events=100)
+    write_history(search, searches=[event], rollups=search.export_history()["rollups"])
+    search.rollup_history(retention_days=90, max_events=100)
+    [rollup] = search.export_history()["rollups"]
+    assert rollup["count"] == 2 and rollup["top"] == {"a": 2}
+
+def test_nothing_to_roll_up_leaves_the_file_alone(search):
+    write_history(search, searches=[search_event("recent", 1)])
+    with open(search.db_path) as f:
+        before = f.read()
+    assert search.rollup_history(retention_days=90, max_events=100) == {"events_rolled_up": 0, "reclaimed_bytes": 0}
+    with open(search.db_path) as f:
+        assert f.read() == before
@@ -0,0 +1,139 @@
+import io
+import os
+import tarfile
+import threading
+import time
+
+import pytest
+
+from core.config import settings
+from services.coordination_service import coordination_service
+from services.maintenance_service import MAINTENANCE_LOCK
+from services.search_service import search_service
+from services.snapshot_service import snapshot_service, SnapshotError
+
+@pytest.fixture
+def stores(mongo, chroma, storage, monkeypatch, tmp_path):
+    # mongomock's bulk_write does not accept the operations current pymongo builds
+    monkeypatch.setattr(mongo, "bulk_write", lambda ops, ordered=True: [
+        mongo.replace_one(op._filter, op._doc, upsert=op._upsert) for op in ops], raising=False)
+    monkeypatch.setattr(search_service, "db_path", str(tmp_path / "search_data.json"))
+    search_service._ensure_db()
+    return mongo, chroma, storage
+
+def populate(mongo, rag, uploads):
+    for tenant_id, document_id in ((settings.DEFAULT_TENANT, "paper-a"), ("acme", "paper-b")):
+        mongo.insert_one({"_id": document_id, "id": document_id, "tenant_id": tenant_id, "filename": f"{document_id}.pdf",
+                          "status": "ready", "summary": f"Summary of {document_id}", "created_at": 1.0, "updated_at": 1.0})
+        rag.collection_for(tenant_id).add(
+            ids=[f"{document_id}_chunk_{i}" for i in range(3)],
+            documents=[f"chunk {i} of {document_id}" for i in range(3)],
+            embeddings=[[float(i), 0.5, 0.25, 1.0] for i in range(3)],
+            metadatas=[{"document_id": document_id, "chunk_index": i} for i in range(3)],
+        )
+    with open(uploads / "audio" / "paper-a.mp3", "wb") as f:
+        f.write(b"ID3 podcast")
+    search_service.record_search("u1", "transformers")
+
+def wipe(mongo, rag, uploads):
+    mongo.delete_many({})
+    for collection in rag._chroma().list_collections():
+        rag.drop_collection(getattr(collection, "name", collection))
+    os.remove(uploads / "audio" / "paper-a.mp3")
+    search_service._write_db({"searches": [], "interactions": []})
+
+def export() -> bytes:
+    buffer = io.BytesIO()
+    snapshot_service.export(buffer)
+    return buffer.getvalue()
+
+def chunk_ids(rag, tenant_id):
+    return sorted(rag.collection_for(tenant_id).get(include=[])["ids"])
+
+def assert_nothing_restored(mongo, rag, uploads):
+    assert mongo.count_documents({}) == 0
+    assert rag._chroma().list_collections() == []
+    assert os.listdir(uploads / "audio") == []
+
+def test_round_trip_restores_every_tenant(stores):
+    mongo, rag, uploads = stores
+    populate(mongo, rag, uploads)
+    records = sorted(mongo.find({}), key=lambda d: d["_id"])
+    data = export()
+    wipe(mongo, rag, uploads)
+
+    result = snapshot_service.restore(io.BytesIO(data))
+
+    assert result["documents"] == 2 and result["chunks"] == 6 and result["audio"] == 1 and result["search_events"] == 1
+    assert sorted(mongo.find({}), key=lambda d: d["_id"]) == records
+    assert chunk_ids(rag, settings.DEFAULT_TENANT) == [f"paper-a_chunk_{i}" for i in range(3)]
+    assert chunk_ids(rag, "acme") == [f"paper-b_chunk_{i}" for i in range(3)]
+    with open(uploads / "audio" / "paper-a.mp3", "rb") as f:
+        assert f.read() == b"ID3 podcast"
+    assert [e["query"] for e in search_service.export_history()["searches"]] == ["transformers"]
+
+def test_restoring_twice_does_not_duplicate(stores):
+    mongo, rag, uploads = stores
+    populate(mongo, rag, uploads)
+    data = export()
+    snapshot_service.restore(io.BytesIO(data))
+    assert mongo.count_documents({}) == 2
+    assert len(chunk_ids(rag, "acme")) == 3
+
+@pytest.mark.parametrize("keep", [0.5, 0.9])
+def test_truncated_snapshot_is_rejected_before_anything_is_applied(stores, keep):
+    mongo, rag, uploads = stores
+    populate(mongo, rag, uploads)
+    data = export()
+    wipe(mongo, rag, uploads)
+
+    with pytest.raises(SnapshotError):
+        snapshot_service.restore(io.BytesIO(data[:int(len(data) * keep)]))
+    assert_nothing_restored(mongo, rag, uploads)
+
+def test_part_not_matching_its_checksum_is_rejected_before_anything_is_applied(stores):
+    mongo, rag, uploads = stores
+    populate(mongo, rag, uploads)
+    data = export()
+    wipe(mongo, rag, uploads)
+
+    # Rewrite the archive with one audio part altered but its recorded sha256 kept
+    tampered = io.BytesIO()
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r|") as source, \
+            tarfile.open(fileobj=tampered, mode="w|", format=tarfile.PAX_FORMAT) as target:
+        for member in source:
+            body = source.extractfile(member).read()
+            if member.name.startswith("audio/"):
+                body = b"ID3 tampered"
+                member.size = len(body)
+            target.addfile(member, io.BytesIO(body))
+
+    with pytest.raises(SnapshotError, match="Checksum mismatch"):
+        snapshot_service.restore(io.BytesIO(tampered.getvalue()))
+    assert_nothing_restored(mongo, rag, uploads)
+
+def test_restore_waits_for_storage_maintenance(stores):
+    mongo, rag, uploads = stores
+    populate(mongo, rag, uploads)
+    data = export()
+    wipe(mongo, rag, uploads)
+
+    holding, release = threading.Event(), threading.Event()
+
+    def maintenance():
+        with coordination_service.single_flight(MAINTENANCE_LOCK):
+            holding.set()
+            release.wait(5)
+
+    gc = threading.Thread(target=maintenance)
+    gc.start()
+    holding.wait(5)
+    restore = threading.Thread(target=snapshot_service.restore, args=(io.BytesIO(data),))
+    restore.start()
+    time.sleep(0.3)
+    assert restore.is_alive() and mongo.count_documents({}) == 0
+
+    release.set()
+    gc.join(5)
+    restore.join(5)
+    assert not restore.is_alive() and mongo.count_documents({}) == 2
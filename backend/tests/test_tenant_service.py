@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from core.config import settings
+from services.tenant_service import QuotaExceeded, TenantService
+
+@pytest.fixture
+def tenants(monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_QUOTAS", {"llm": {"per_minute": 3, "concurrent": 1}})
+    monkeypatch.setattr(settings, "TENANT_QUOTA_OVERRIDES", {})
+    monkeypatch.setattr(settings, "TENANT_API_KEYS", {"acme-secret": "acme"})
+    monkeypatch.setattr(settings, "TRUST_TENANT_HEADER", False)
+    return TenantService()
+
+def test_requests_without_headers_use_the_default_tenant(tenants):
+    assert tenants.resolve("") == settings.DEFAULT_TENANT
+    assert tenants.resolve(settings.DEFAULT_TENANT) == settings.DEFAULT_TENANT
+
+def test_api_key_selects_its_tenant(tenants):
+    assert tenants.resolve("", "acme-secret") == "acme"
+    assert tenants.resolve("acme", "acme-secret") == "acme"
+
+def test_unknown_or_mismatched_credentials_are_refused(tenants):
+    with pytest.raises(PermissionError):
+        tenants.resolve("", "wrong")
+    with pytest.raises(PermissionError):
+        tenants.resolve("globex", "acme-secret")
+    with pytest.raises(PermissionError):
+        tenants.resolve("acme")
+
+def test_bare_tenant_header_is_honoured_only_when_trusted(tenants, monkeypatch):
+    monkeypatch.setattr(settings, "TRUST_TENANT_HEADER", True)
+    assert tenants.resolve("globex") == "globex"
+
+def test_malformed_tenant_header_is_rejected(tenants):
+    with pytest.raises(ValueError):
+        tenants.resolve("../etc", "acme-secret")
+
+def test_release_frees_the_concurrency_slot(tenants):
+    tenant_id = tenants.acquire("llm", "acme")
+    with pytest.raises(QuotaExceeded) as excinfo:
+        tenants.acquire("llm", "acme")
+    assert excinfo.value.reason == "concurrency"
+    tenants.release("llm", tenant_id)
+    tenants.release("llm", tenant_id)
+    # Releasing twice must not leave a spare slot behind
+    tenants.acquire("llm", "acme")
+    with pytest.raises(QuotaExceeded):
+        tenants.acquire("llm", "acme")
+
+def test_rate_limit_counts_every_acquisition(tenants):
+    for _ in range(3):
+        with tenants.quota("llm"):
+            pass
+    with pytest.raises(QuotaExceeded) as excinfo:
+        tenants.acquire("llm")
+    assert excinfo.value.reason == "rate"
+    assert 1 <= excinfo.value.retry_after <= 60
+
+def test_tenants_do_not_share_quotas(tenants):
+    tenants.acquire("llm", "acme")
+    tenants.acquire("llm", "globex")
+
+def test_overrides_replace_the_default_limits(tenants, monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_QUOTA_OVERRIDES", {"acme": {"llm": {"concurrent": 2}}})
+    tenants.acquire("llm", "acme")
+    tenants.acquire("llm", "acme")
+    with pytest.raises(QuotaExceeded):
+        tenants.acquire("llm", "acme")
+
+def test_waiting_acquire_gets_the_slot_once_it_is_released(tenants):
+    tenant_id = tenants.acquire("llm", "acme")
+    threading.Timer(0.1, tenants.release, ("llm", tenant_id)).start()
+    start = time.monotonic()
+    with tenants.waiting_for_quota(5):
+        tenants.acquire("llm", "acme")
+    assert time.monotonic() - start < 5
+
+def test_waiting_acquire_gives_up_at_its_deadline(tenants):
+    tenants.acquire("llm", "acme")
+    start = time.monotonic()
+    with pytest.raises(QuotaExceeded):
+        tenants.acquire("llm", "acme", wait=0.2)
+    assert 0.2 <= time.monotonic() - start < 2
@@ -0,0 +1,56 @@
+import glob
+import os
+
+import pytest
+
+from services.db_service import db_service
+
+FIXTURE = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "*.pdf")))[0]
+
+@pytest.fixture
+def api(mongo, chroma, storage, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    ingested = []
+
+    def fake_ingest(file_path, file_name, file_id):
+        ingested.append(file_id)
+        db_service.save_document({"id": file_id, "status": "ready", "summary": f"Summary of {file_name}"})
+
+    monkeypatch.setattr(main, "_process_pdf", fake_ingest)
+    client = TestClient(main.app)
+    client.ingested = ingested
+    return client
+
+def upload(api, name="paper.pdf", data=None):
+    if data is None:
+        with open(FIXTURE, "rb") as f:
+            data = f.read()
+    response = api.post("/api/upload", files={"file": (name, data, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()
+
+def test_identical_bytes_return_the_existing_document(api, storage):
+    first = upload(api)
+    again = upload(api, name="renamed.pdf")
+
+    assert again["duplicate"] is True and again["document_id"] == first["document_id"]
+    assert again["status"] == "ready" and again["summary"] == "Summary of paper.pdf"
+    assert api.ingested == [first["document_id"]]
+    assert [name for name in os.listdir(storage) if name.endswith(".pdf")] == [f"{first['document_id']}.pdf"]
+
+def test_different_bytes_are_ingested_separately(api):
+    first = upload(api)
+    other = upload(api, data=b"%PDF-1.4 another paper")
+    assert "duplicate" not in other and other["document_id"] != first["document_id"]
+    assert len(api.ingested) == 2
+
+def test_upload_after_delete_creates_a_new_document(api):
+    first = upload(api)
+    assert api.delete(f"/api/documents/{first['document_id']}").status_code == 200
+
+    again = upload(api)
+
+    assert "duplicate" not in again and again["document_id"] != first["document_id"]
+    assert api.ingested == [first["document_id"], again["document_id"]]
+    assert db_service.get_document(again["document_id"])["status"] == "ready"
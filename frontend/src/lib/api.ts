@@ -14,9 +14,31 @@ export const api = {
     },
 
     getDocuments: async () => {
-        const response = await fetch(`${API_BASE_URL}/documents`);
-        if (!response.ok) throw new Error('Failed to fetch documents');
-        return response.json();
+        // The list is paginated; follow next_cursor so older papers are not dropped
+        const documents: any[] = [];
+        let cursor: string | null = null;
+        do {
+            const params = new URLSearchParams({ limit: '200' });
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`${API_BASE_URL}/documents?${params}`);
+            if (!response.ok) throw new Error('Failed to fetch documents');
+            const page = await response.json();
+            documents.push(...page.documents);
+            cursor = page.next_cursor;
+        } while (cursor);
+        return { documents };
+    },
+
+    getDocumentChanges: async (since: number | null = null, signal?: AbortSignal) => {
+        // Long-polls for cards changed after `since`; without it, returns the cursor to start from
+        const params = new URLSearchParams();
+        if (since !== null) params.set('since', String(since));
+        const response = await fetch(`${API_BASE_URL}/documents/changes?${params}`, { signal });
+        // The cursor is older than the server remembers deletions for: reload the list
+        if (response.status === 410) return { expired: true, documents: [], cursor: null };
+        if (!response.ok) throw new Error('Failed to fetch document changes');
+        const page = await response.json();
+        return { expired: false, documents: page.documents, cursor: page.cursor as number };
     },
 
     getDocument: async (documentId: string) => {
@@ -25,8 +25,11 @@ const Dashboard = () => {
     const navigate = useNavigate();
 
     useEffect(() => {
-        fetchDocuments();
         fetchFeed();
+        // Load the list once, then follow the changes feed instead of re-listing every page
+        const controller = new AbortController();
+        syncDocuments(controller.signal);
+        return () => controller.abort();
     }, []);
 
     const fetchFeed = async () => {
@@ -80,12 +83,44 @@ const Dashboard = () => {
         });
     };
 
-    const fetchDocuments = async () => {
-        try {
-            const data = await api.getDocuments();
-            setDocuments(data.documents || []);
-        } catch (e) {
-            console.error(e);
+    const applyDocumentChanges = (changes: any[]) => {
+        const deleted = new Set(changes.filter(c => c.status === 'deleted').map(c => c.id));
+        const updated = changes.filter(c => c.status !== 'deleted');
+        setDocuments(prev => {
+            const byId = new Map<string, any>(updated.map(c => [c.id, c] as [string, any]));
+            const kept = prev
+                .filter(d => !deleted.has(d.id))
+                .map(d => byId.has(d.id) ? { ...d, ...byId.get(d.id) } : d);
+            const added = updated.filter(c => !prev.some(d => d.id === c.id)).reverse();
+            return [...added, ...kept];
+        });
+        if (deleted.size > 0) setSelectedDocs(prev => prev.filter(d => !deleted.has(d.id)));
+    };
+
+    const syncDocuments = async (signal: AbortSignal) => {
+        let cursor: number | null = null;
+        while (!signal.aborted) {
+            try {
+                if (cursor === null) {
+                    // Take the cursor before listing so nothing changed in between is missed
+                    const start = await api.getDocumentChanges(null, signal);
+                    const data = await api.getDocuments();
+                    setDocuments(data.documents || []);
+                    cursor = start.cursor;
+                    continue;
+                }
+                const changes = await api.getDocumentChanges(cursor, signal);
+                if (changes.expired) {
+                    cursor = null;
+                    continue;
+                }
+                if (changes.documents.length > 0) applyDocumentChanges(changes.documents);
+                cursor = changes.cursor;
+            } catch (e) {
+                if (signal.aborted) return;
+                console.error(e);
+                await new Promise(resolve => setTimeout(resolve, 5000));
+            }
         }
     };
 
@@ -95,8 +130,8 @@ const Dashboard = () => {
 
         setUploading(true);
         try {
+            // The new card arrives through the changes feed
             await api.uploadDocument(file);
-            await fetchDocuments();
         } catch (e) {
             alert("Upload failed. Ensure backend is running.");
         } finally {